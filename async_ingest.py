@@ -0,0 +1,238 @@
+"""
+Concurrent ingestion of many .sss files, one report per .sss stream:
+
+    readers  -> bounded queue -> decoder processes -> writer processes
+    (threads)   (raw records)    (TestResult)         (Excel/PDF/HTML)
+
+A fixed number of readers take the files in the given order, frame their records in threads and drop filtered or
+duplicate ones on the raw header bytes. Batches wait in a bounded queue for the decoder pool, and a decoded stream
+waits for a free writer. A full queue stops the readers and busy writers stop the decoders and readers. A report needs
+every record of its stream, so the decoded records of a stream are held until it is written. Memory is bounded by
+the streams being written (one per writer), the complete streams waiting for a writer (at most one per decode task),
+the streams being read (one per reader) and the queue_size raw batches, whatever the number of files.
+
+The first error in any reader, decoder or writer cancels the rest of the run and is raised.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pipeline import get_result_file_path, init_worker, is_snapshot, parse_snapshot, render_in_worker
+from record_types import MachineInfo, StringDictionary, TestResult, record_type_class_defs
+from sss_reader import RecordDeduplicator, open_sources, read_records
+
+logger = logging.getLogger()
+
+_strings = None
+
+
+def _init_decoder():
+    # one string dictionary per decoder process, shared by every batch it decodes
+    global _strings
+    _strings = StringDictionary()
+
+
+def _decode_batch(record_contents, fields):
+    return [TestResult(record_content[1:], fields, _strings) for record_content in record_contents]
+
+
+def read_framed(file_path, batch_size):
+    # runs in reader threads, yields (source name, [(checksum, record_content)]) and (source name, None) at the end
+    for source_name, source in open_sources(file_path):
+        with source as f:
+            batch = []
+            for framed in read_records(f):
+                batch.append(framed)
+                if len(batch) == batch_size:
+                    yield source_name, batch
+                    batch = []
+            if len(batch) > 0:
+                yield source_name, batch
+        yield source_name, None
+
+
+class IngestedSource:
+    def __init__(self, name, result_file_path):
+        self.name = name
+        self.result_file_path = result_file_path
+        self.machine_info = None
+        self.batches = {}
+        self.batch_count = 0
+        self.decoded = 0
+        self.read_done = False
+
+    @property
+    def complete(self):
+        return self.read_done and self.decoded == self.batch_count
+
+    def test_results(self):
+        return [record for seq in range(self.batch_count) for record in self.batches[seq]]
+
+
+class AsyncIngestion:
+    """
+    Duplicates are dropped across files as they are read. With more than one reader, which of two files read at the
+    same time keeps a shared record depends on timing; readers=1 drops them in file order, exactly like run_batch().
+    .sssnap snapshots are loaded and filtered in a reader thread, without deduplicating again.
+    """
+
+    def __init__(self, output_dir='', excel=True, pdf=True, html=False, excel_styling='cells', record_filter=None,
+                 fields=None, decoders=None, writers=None, readers=None, queue_size=8, batch_size=256):
+        self.output_dir = output_dir
+        self.record_filter = record_filter
+        self.fields = fields
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        # rendering takes longer than decoding, by default half the cores write and the other half decode
+        self.writers = writers if writers is not None else max(1, os.cpu_count() // 2)
+        self.decoders = decoders if decoders is not None else max(1, os.cpu_count() - self.writers)
+        # as many files read at once as can be written at once, so streams finish one after another
+        self.readers = readers if readers is not None else self.writers
+        self.writer_args = (excel, pdf, html, excel_styling)
+        self.deduplicator = RecordDeduplicator()
+        self.used_result_file_paths = set()
+        self.written = {}
+
+    def start(self, coro):
+        task = asyncio.create_task(coro)
+        task.add_done_callback(self.task_done)
+        self.tasks.append(task)
+        return task
+
+    def task_done(self, task):
+        if not task.cancelled() and task.exception() is not None and not self.failure.done():
+            self.failure.set_exception(task.exception())
+
+    async def read_files(self, file_paths):
+        # readers share the iterator, so the files are taken in the given order
+        for file_path in file_paths:
+            if is_snapshot(file_path):
+                await self.read_snapshot(file_path)
+            else:
+                await self.read(file_path)
+
+    async def read_snapshot(self, file_path):
+        source = self.new_source(file_path)
+        source.machine_info, source.batches[0] = await asyncio.to_thread(parse_snapshot, file_path, self.record_filter)
+        source.batch_count = source.decoded = 1
+        source.read_done = True
+        await self.finish_if_complete(source)
+
+    async def read(self, file_path):
+        framed_batches = read_framed(file_path, self.batch_size)
+        source = None
+        while True:
+            item = await asyncio.to_thread(next, framed_batches, None)
+            if item is None:
+                return
+            source_name, framed = item
+            if source is None:
+                source = self.new_source(source_name)
+            if framed is None:
+                source.read_done = True
+                logger.info(f"Read {source_name}, {source.batch_count} batches")
+                await self.finish_if_complete(source)
+                source = None
+                continue
+
+            # filtering and deduplication stay in the event loop, they need no locking and only touch raw bytes
+            record_contents = []
+            for checksum, record_content in framed:
+                if record_content[0] != 0x01:
+                    instance = record_type_class_defs[record_content[0]](record_content[1:])
+                    if type(instance) is MachineInfo:
+                        source.machine_info = instance
+                    continue
+                if self.record_filter is not None and not self.record_filter.matches(record_content):
+                    continue
+                machine_serial = source.machine_info.machine_serial_number if source.machine_info is not None else ''
+                if self.deduplicator.is_duplicate(machine_serial, checksum, record_content):
+                    continue
+                record_contents.append(record_content)
+
+            await self.queue.put((source, source.batch_count, record_contents))
+            source.batch_count += 1
+
+    def new_source(self, source_name):
+        result_file_path = get_result_file_path(source_name, self.output_dir)
+        if result_file_path in self.used_result_file_paths:
+            result_file_path = f"{result_file_path}_{len(self.used_result_file_paths)}"
+        self.used_result_file_paths.add(result_file_path)
+        return IngestedSource(source_name, result_file_path)
+
+    async def decode(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            source, seq, record_contents = item
+            source.batches[seq] = await loop.run_in_executor(self.decoder_pool, _decode_batch, record_contents,
+                                                             self.fields)
+            source.decoded += 1
+            await self.finish_if_complete(source)
+
+    async def finish_if_complete(self, source):
+        if not source.complete:
+            return
+        # waiting for a free writer holds this decoder (or reader) back, which in turn fills the queue
+        await self.writer_slots.acquire()
+        self.write_tasks.append(self.start(self.write(source)))
+
+    async def write(self, source):
+        loop = asyncio.get_running_loop()
+        try:
+            test_results = source.test_results()
+            logger.info(f"Decoded {len(test_results)} record from {source.name}")
+            file_paths, failed = await loop.run_in_executor(self.writer_pool, render_in_worker, source.result_file_path,
+                                                            source.machine_info, test_results)
+            self.written[source.name] = file_paths
+            logger.info(f"{source.name} has been written to {', '.join(file_paths)}, {failed} FAILED")
+        finally:
+            source.batches = {}
+            self.writer_slots.release()
+
+    async def ingest(self, file_paths):
+        # twice as many decode tasks as decoder processes, so a process never waits for its next batch
+        decode_tasks = [self.start(self.decode()) for _ in range(self.decoders * 2)]
+        files = iter(file_paths)
+        await asyncio.gather(*(self.start(self.read_files(files)) for _ in range(self.readers)))
+        for _ in decode_tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*decode_tasks)
+        # every stream has been handed to a writer once all readers and decoders are done
+        await asyncio.gather(*self.write_tasks)
+
+    async def run(self, file_paths):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.writer_slots = asyncio.Semaphore(self.writers)
+        self.write_tasks = []
+        self.tasks = []
+        self.failure = asyncio.get_running_loop().create_future()
+
+        with ProcessPoolExecutor(max_workers=self.decoders, initializer=_init_decoder) as self.decoder_pool, \
+                ProcessPoolExecutor(max_workers=self.writers, initializer=init_worker,
+                                    initargs=self.writer_args) as self.writer_pool:
+            work = asyncio.create_task(self.ingest(file_paths))
+            await asyncio.wait([work, self.failure], return_when=asyncio.FIRST_COMPLETED)
+            if self.failure.done():
+                # a task that dies would leave the others waiting on the queue or on a writer, stop them all
+                for task in self.tasks + [work]:
+                    task.cancel()
+                await asyncio.gather(*self.tasks, work, return_exceptions=True)
+                raise self.failure.exception()
+            work.result()
+
+        logger.info(f"Ingested {len(self.written)} files, dropped {self.deduplicator.dropped} duplicate in total")
+        return self.written
+
+
+def ingest(file_paths, output_dir='', **kwargs):
+    """
+    One report per .sss stream or snapshot, like ReportPipeline.run_batch(), with reading, decoding and rendering of
+    the files overlapped. Takes the AsyncIngestion options and returns {source name: written file paths}.
+    """
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    return asyncio.run(AsyncIngestion(output_dir=output_dir, **kwargs).run(file_paths))
@@ -0,0 +1,178 @@
+from copy import copy
+
+import openpyxl
+from openpyxl import Workbook
+from openpyxl.cell.cell import MergedCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Alignment, PatternFill
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet.cell_range import CellRange
+
+headers = [
+    "Asset ID", "Site Name", "Location Name", "Test Time",
+    "Test Operator", "Overall Result", "Program", "Comments",
+    "Next Full Test Date", "Next Formal Visual Test Date", "Test Result"
+]
+sub_headers = ["", "", "", "", "", "", "", "", "", "", "Test Type", "Result", "Unit", "Status"]
+first_record_row = 4
+# columns holding a date on the first row of every record
+date_columns = (4, 9, 10)
+
+# merge() and the conditional styling's default cell format use openpyxl internals, only trusted on the versions they
+# were checked against, other versions go through the public API
+openpyxl_internals = openpyxl.__version__.startswith('3.1.')
+
+
+def merge(ws, start_row, start_column, end_row, end_column):
+    # same as ws.merge_cells() without its check against every range merged so far, which makes a large report
+    # quadratic, and without the border bookkeeping, the report has no borders. It never merges a range twice.
+    if not openpyxl_internals:
+        ws.merge_cells(start_row=start_row, start_column=start_column, end_row=end_row, end_column=end_column)
+        return
+    ws.merged_cells.ranges.add(CellRange(min_col=start_column, min_row=start_row, max_col=end_column, max_row=end_row))
+    for row in range(start_row, end_row + 1):
+        for col in range(start_column, end_column + 1):
+            if row != start_row or col != start_column:
+                ws._cells[row, col] = MergedCell(ws, row, col)
+
+
+class ExcelReportRenderer:
+    """
+    Holds the fill and alignment styles shared by every cell, so rendering many workbooks in one process does not
+    rebuild them for each report (or for each cell).
+
+    styling='cells' sets the fill and the alignment on every cell that needs them. styling='conditional' makes the
+    centered alignment the default cell format of the workbook and highlights FAIL with conditional formatting keyed
+    on the status columns, so the highlight follows edits: the test columns of a row whose Status is FAIL and the
+    Asset ID of a record whose Overall Result is FAIL. Comment rows are excluded by a rule over their (merged) rows.
+    This keeps the workbook smaller and faster to write on large reports.
+    """
+
+    def __init__(self, styling='cells'):
+        assert styling in ('cells', 'conditional'), f'Unknown Excel styling {styling}'
+        self.styling = styling
+        self.fill = PatternFill(start_color="F56C6C", end_color="F56C6C", fill_type="solid")
+        self.alignment = Alignment(horizontal="center", vertical="center")
+
+    def set_default_alignment(self, wb):
+        # cells without a style of their own use the first cell format, make it the centered one
+        default_style = StyleArray()
+        default_style.alignmentId = wb._alignments.add(self.alignment)
+        wb._cell_styles = IndexedList([default_style])
+        return default_style
+
+    def add_fail_rules(self, ws, last_row, plain_row_ranges):
+        if last_row < first_record_row:
+            return
+        # rules are evaluated in the order they are added, comment rows stop before the FAIL rule is checked
+        if len(plain_row_ranges) > 0:
+            ws.conditional_formatting.add(' '.join(f"K{start}:N{end}" for start, end in plain_row_ranges),
+                                          FormulaRule(formula=['TRUE'], stopIfTrue=True))
+        ws.conditional_formatting.add(f"A{first_record_row}:A{last_row}",
+                                      FormulaRule(formula=[f'$F{first_record_row}="FAIL"'], fill=self.fill))
+        ws.conditional_formatting.add(f"K{first_record_row}:N{last_row}",
+                                      FormulaRule(formula=[f'$N{first_record_row}="FAIL"'], fill=self.fill))
+
+    def render(self, file_path, machine_info, formatted_groups):
+        wb = Workbook()
+        ws = wb.active
+        conditional = self.styling == 'conditional'
+        default_alignment = conditional and openpyxl_internals
+        if default_alignment:
+            default_style = self.set_default_alignment(wb)
+            date_style = None
+        # [first row, last row] of consecutive comment rows
+        plain_row_ranges = []
+
+        # Instrument info
+        ws.append(
+            ["Test Instrument Model", "", "", machine_info.machine_model, "", "", "", "Test Instrument Serial Number",
+             "", "", machine_info.machine_serial_number, "", "", ""])
+        merge(ws, 1, 1, 1, 3)
+        merge(ws, 1, 4, 1, 7)
+        merge(ws, 1, 8, 1, 10)
+        merge(ws, 1, 11, 1, 14)
+
+        ws.append(headers)
+        ws.append(sub_headers)
+
+        for col in range(1, 11):
+            merge(ws, 2, col, 3, col)
+        merge(ws, 2, 11, 2, 14)
+
+        current_row_excel = first_record_row
+        for location, formatted_records in formatted_groups.items():
+            for formatted in formatted_records:
+                record = formatted.record
+                for i, tr in enumerate(formatted.rows):
+                    if i == 0:
+                        row = [
+                            record.asset_id,
+                            record.site_name,
+                            record.location_name,
+                            record.test_time,
+                            record.test_operator,
+                            record.get_status(),
+                            record.program,
+                            record.comments,
+                            record.next_full_test_date,
+                            record.next_formal_visual_test_date
+                        ]
+                    else:
+                        row = [""] * 10
+                    row.extend(tr)
+                    ws.append(row)
+
+                if default_alignment:
+                    # dates get a number format, i.e. a cell format of their own, which needs the alignment too
+                    for col in date_columns:
+                        cell = ws._cells[current_row_excel, col]
+                        if date_style is None:
+                            number_format = cell.number_format
+                            cell._style = copy(default_style)
+                            cell.number_format = number_format
+                            date_style = cell._style
+                        cell._style = copy(date_style)
+
+                used_row = len(formatted)
+
+                # merge information cols
+                if used_row > 1:
+                    for col in range(1, 11):
+                        merge(ws, current_row_excel, col, current_row_excel + used_row - 1, col)
+                for i in formatted.merge_rows:
+                    merge(ws, current_row_excel + i, 12, current_row_excel + i, 13)
+
+                # highlight fail cells
+                if conditional:
+                    for i in formatted.plain_rows:
+                        if len(plain_row_ranges) > 0 and plain_row_ranges[-1][1] == current_row_excel + i - 1:
+                            plain_row_ranges[-1][1] += 1
+                        else:
+                            plain_row_ranges.append([current_row_excel + i, current_row_excel + i])
+                elif formatted.failed:
+                    ws.cell(row=current_row_excel, column=1).fill = self.fill
+                    for i in formatted.failed_rows:
+                        for col in range(11, 15):
+                            ws.cell(row=current_row_excel + i, column=col).fill = self.fill
+
+                current_row_excel += used_row
+
+        if conditional:
+            self.add_fail_rules(ws, current_row_excel - 1, plain_row_ranges)
+        if not default_alignment:
+            for row in ws.iter_rows():
+                for cell in row:
+                    cell.alignment = self.alignment
+
+        for col in ws.columns:
+            max_length = 0
+            col_letter = get_column_letter(col[0].column)
+            for cell in col:
+                if cell.value:
+                    max_length = max(max_length, len(str(cell.value)))
+            ws.column_dimensions[col_letter].width = max_length + 2
+
+        wb.save(file_path)
@@ -0,0 +1,249 @@
+import logging
+import math
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from pipeline import is_snapshot, parse_snapshot
+from record_types import EarthResistanceTestResult, IECLeadContinuityTestResult, PointToPointTestResult, \
+    InsulationTestResult, SubstituteLeakageTestResult, PolarityTestResult, MainVoltageTestResult, \
+    TouchOrLeakageCurrentTestResult, RCDTestResult, StringComment, MachineInfo, TestResult, record_type_class_defs
+from sss_reader import RecordDeduplicator, open_sources, read_records
+
+logger = logging.getLogger()
+
+# everything the summary reads, the rest of each record is not decoded
+summary_fields = ('flags', 'asset_id', 'site_name', 'location_name', 'test_time', 'next_full_test_date',
+                  'visual_test_results', 'physical_test_results')
+
+test_type_names = {
+    EarthResistanceTestResult: "Earth Continuity",
+    IECLeadContinuityTestResult: "IEC Lead Continuity",
+    PointToPointTestResult: "Point To Point Resistance",
+    InsulationTestResult: "Insulation",
+    SubstituteLeakageTestResult: "Substitute Leakage Current",
+    PolarityTestResult: "IEC Lead Polarity",
+    MainVoltageTestResult: "Main Voltage",
+    TouchOrLeakageCurrentTestResult: "Touch Or Leakage Current",
+    RCDTestResult: "RCD",
+}
+
+distributions = {
+    "Earth Resistance (ohm)": [(EarthResistanceTestResult, 'resistance')],
+    "Insulation Resistance (mohm)": [(InsulationTestResult, 'resistance')],
+    "Leakage Current (ma)": [(SubstituteLeakageTestResult, 'current'),
+                             (TouchOrLeakageCurrentTestResult, 'leakage_current')],
+    "RCD Trip Time (ms)": [(RCDTestResult, 'trip_time')],
+}
+distribution_attrs = {}
+for distribution_name, sources in distributions.items():
+    for cls, attr in sources:
+        distribution_attrs.setdefault(cls, []).append((distribution_name, attr))
+
+
+class ValueDistribution:
+    """
+    Counts per value. Measurements come out of the 16-bit float format already rounded to 2 decimals, so there are
+    few distinct values: quantiles are exact, memory stays bounded and two distributions merge by adding counts.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, value):
+        self.counts[value] += 1
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def quantile(self, q):
+        # nearest rank
+        rank = max(1, math.ceil(q * len(self)))
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen >= rank:
+                return value
+
+    def describe(self):
+        if len(self) == 0:
+            return "no measurements"
+        return (f"n = {len(self)}, min = {min(self.counts)}, median = {self.quantile(0.5)}, "
+                f"p95 = {self.quantile(0.95)}, max = {max(self.counts)}")
+
+
+class FleetSummary:
+    """
+    Aggregates for the summary report, filled in one pass with add() and combined with merge(), so partial summaries
+    from parallel workers add up to the same result as a single pass.
+    """
+
+    def __init__(self):
+        self.location_counts = Counter()
+        self.location_failed = Counter()
+        self.test_counts = Counter()
+        self.test_failed = Counter()
+        self.distributions = {name: ValueDistribution() for name in distributions}
+        # asset_id -> (test_time, next_full_test_date, location) of its latest test
+        self.latest_tests = {}
+
+    def add(self, record):
+        location = f"{record.site_name} - {record.location_name}"
+        self.location_counts[location] += 1
+        if record.get_status() == 'FAIL':
+            self.location_failed[location] += 1
+
+        for visual_test_result in record.visual_test_results:
+            self.add_test(f"Visual - {visual_test_result.name}", visual_test_result.flags)
+        for physical_test_result in record.physical_test_results:
+            if isinstance(physical_test_result, StringComment):
+                continue
+            self.add_test(test_type_names[type(physical_test_result)], physical_test_result.flags)
+            for distribution_name, attr in distribution_attrs.get(type(physical_test_result), []):
+                self.distributions[distribution_name].add(getattr(physical_test_result, attr).value)
+
+        latest = self.latest_tests.get(record.asset_id)
+        if latest is None or record.test_time > latest[0]:
+            self.latest_tests[record.asset_id] = (record.test_time, record.next_full_test_date, location)
+
+    def add_test(self, name, flags):
+        self.test_counts[name] += 1
+        if 'FAIL' in flags:
+            self.test_failed[name] += 1
+
+    def merge(self, other):
+        self.location_counts.update(other.location_counts)
+        self.location_failed.update(other.location_failed)
+        self.test_counts.update(other.test_counts)
+        self.test_failed.update(other.test_failed)
+        for name, distribution in other.distributions.items():
+            self.distributions[name].merge(distribution)
+        for asset_id, latest in other.latest_tests.items():
+            if asset_id not in self.latest_tests or latest[0] > self.latest_tests[asset_id][0]:
+                self.latest_tests[asset_id] = latest
+        return self
+
+    def overdue(self, as_of):
+        overdue = Counter()
+        for test_time, next_full_test_date, location in self.latest_tests.values():
+            if next_full_test_date < as_of:
+                overdue[location] += 1
+        return overdue
+
+    def render_text(self, machine_info=None, as_of=None):
+        as_of = datetime.now() if as_of is None else as_of
+        overdue = self.overdue(as_of)
+        total = sum(self.location_counts.values())
+        failed = sum(self.location_failed.values())
+
+        lines = ["Portable Appliance Test (PAT) Fleet Summary", ""]
+        if machine_info is not None:
+            lines.append(f"Tester: {machine_info.machine_model} {machine_info.machine_serial_number}")
+        lines.extend([
+            f"Records: {total}, FAILED: {failed} ({rate(failed, total)}), assets: {len(self.latest_tests)}, "
+            f"overdue for a full test on {as_of.strftime('%d/%m/%Y')}: {sum(overdue.values())}",
+            "",
+            "Site - Location",
+        ])
+        for location, count in self.location_counts.items():
+            lines.append(f"  {location}: {count} records, {self.location_failed[location]} FAILED "
+                         f"({rate(self.location_failed[location], count)}), {overdue[location]} overdue")
+
+        lines.extend(["", "Fail rate per test type"])
+        for name, count in sorted(self.test_counts.items()):
+            lines.append(f"  {name}: {self.test_failed[name]} / {count} ({rate(self.test_failed[name], count)})")
+
+        lines.extend(["", "Distributions"])
+        for name, distribution in self.distributions.items():
+            lines.append(f"  {name}: {distribution.describe()}")
+        return '\n'.join(lines) + '\n'
+
+
+def rate(part, total):
+    return f"{part / total * 100:.1f}%" if total else "n/a"
+
+
+def summarize(test_results):
+    summary = FleetSummary()
+    for record in test_results:
+        summary.add(record)
+    return summary
+
+
+def summarize_batch(record_contents):
+    # runs in a worker, every record is added to the summary as soon as it is decoded
+    summary = FleetSummary()
+    for record_content in record_contents:
+        summary.add(TestResult(record_content[1:], summary_fields))
+    return summary
+
+
+def framed_batches(file_paths, record_filter, deduplicator, batch_size, machine_infos):
+    # frames, filters and deduplicates in file order like sss_reader.parse_files, so the same record is kept whatever
+    # the number of workers. Yields lists of raw test records, tester info goes into machine_infos.
+    for file_path in file_paths:
+        for source_name, source in open_sources(file_path):
+            machine_info = None
+            batch = []
+            with source as f:
+                for checksum, record_content in read_records(f):
+                    if record_content[0] != 0x01:
+                        instance = record_type_class_defs[record_content[0]](record_content[1:])
+                        if type(instance) is MachineInfo:
+                            machine_info = instance
+                            machine_infos.append(instance)
+                        continue
+                    if record_filter is not None and not record_filter.matches(record_content):
+                        continue
+                    machine_serial = machine_info.machine_serial_number if machine_info is not None else ''
+                    if deduplicator.is_duplicate(machine_serial, checksum, record_content):
+                        continue
+                    batch.append(record_content)
+                    if len(batch) == batch_size:
+                        yield batch
+                        batch = []
+            if len(batch) > 0:
+                yield batch
+
+
+def summarize_files(file_paths, record_filter=None, workers=None, batch_size=1024):
+    """
+    One pass over every record of the files: framing, filtering and deduplication (within and across files) happen
+    here, batches of raw records are decoded and summarized in worker processes and the partial summaries merged.
+    .sssnap snapshots are filtered and summarized here, without deduplicating again.
+    """
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    sss_file_paths = [file_path for file_path in file_paths if not is_snapshot(file_path)]
+    snapshot_file_paths = [file_path for file_path in file_paths if is_snapshot(file_path)]
+    deduplicator = RecordDeduplicator()
+    machine_infos = []
+    summary = FleetSummary()
+    batches = framed_batches(sss_file_paths, record_filter, deduplicator, batch_size, machine_infos)
+
+    if workers == 1:
+        for batch in batches:
+            summary.merge(summarize_batch(batch))
+    else:
+        workers = workers if workers is not None else os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # at most two batches per worker in flight, so reading never runs far ahead of decoding
+            max_pending = workers * 2
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(summarize_batch, batch))
+                if len(pending) >= max_pending:
+                    summary.merge(pending.popleft().result())
+            while len(pending) > 0:
+                summary.merge(pending.popleft().result())
+    logger.info(f"Summarized {sum(summary.location_counts.values())} record, dropped {deduplicator.dropped} duplicate")
+
+    for file_path in snapshot_file_paths:
+        machine_info, test_results = parse_snapshot(file_path, record_filter)
+        machine_infos.append(machine_info)
+        summary.merge(summarize(test_results))
+    return (machine_infos[0] if len(machine_infos) > 0 else None), summary
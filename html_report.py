@@ -0,0 +1,133 @@
+import base64
+import os
+from functools import lru_cache
+from html import escape as escape_html
+
+# test names, units and statuses repeat on almost every record, bounded so memory stays flat
+escape = lru_cache(maxsize=4096)(escape_html)
+
+logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imgs', 'combined-logo.png')
+
+style = """
+body { font-family: Helvetica, Arial, sans-serif; font-size: 8pt; margin: 1cm; }
+h1 { font-size: 16pt; margin: 0 0 1cm 0; }
+table { border-collapse: collapse; width: 100%; }
+.section { margin-bottom: 0.5cm; }
+.section-header, .location { background: rgb(26, 51, 102); color: white; font-weight: bold; font-size: 9pt; }
+.box { border: 1px solid grey; }
+.tec { display: flex; align-items: center; }
+.tec > div { width: 50%; }
+.tec img { display: block; margin: auto; height: 4cm; }
+.tec td { padding: 3px 6px; }
+.grid td, .grid th { border: 0.5px solid lightgrey; padding: 3px 6px; text-align: left; }
+.key { background: rgb(242, 242, 242); }
+.results { border: 1px solid grey; }
+.results th { background: rgb(242, 242, 242); border: 0.5px solid lightgrey; border-bottom: 1px solid grey; }
+.results td { text-align: center; vertical-align: middle; border-left: 0.5px solid lightgrey;
+              border-right: 0.5px solid lightgrey; border-bottom: 0.5px solid lightgrey; padding: 2px 4px; }
+.results td.location { text-align: left; }
+.results tr.last td { border-bottom: 1px solid grey; }
+.fail { background: rgb(252, 224, 224); }
+"""
+
+result_header = """
+<table class="results">
+<thead>
+<tr><th rowspan="2">Appliance ID</th><th rowspan="2">Appliance Description</th><th rowspan="2">Test Date</th>
+<th rowspan="2">Operator</th><th rowspan="2">Program</th><th colspan="4">Test Items</th>
+<th rowspan="2">Overall Status</th><th rowspan="2">Comments</th></tr>
+<tr><th>Test Type</th><th>Result</th><th>Unit</th><th>Status</th></tr>
+</thead>
+"""
+
+
+class HtmlReportRenderer:
+    """
+    Writes an HTML preview with the layout of the PDF report one location at a time. With lazily formatted records
+    only the HTML rows of the current location are held, until its FAILED count is known and its header written. The
+    parsed records themselves are all in memory, as for the other reports. The page head, the TEC block and the
+    embedded logo are built once per renderer.
+    """
+
+    def __init__(self):
+        with open(logo_path, 'rb') as f:
+            logo = base64.b64encode(f.read()).decode('ascii')
+
+        self.head = (f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+                     f'<title>Portable Appliance Test (PAT) Report</title>\n<style>{style}</style>\n</head>\n<body>\n'
+                     f'<h1>Portable Appliance Test (PAT) Report</h1>\n')
+        self.tec_info = f"""<div class="section tec">
+<div><table class="box">
+<tr><td class="section-header">TESTING CARRIED OUT BY</td></tr>
+<tr><td style="font-size: 10pt"><b>TEC PA &amp; Lighting</b></td></tr>
+<tr><td><b>Email:</b> info@nottinghamtec.co.uk<br/>
+<b>Website:</b> www.nottinghamtec.co.uk<br/>
+<b>Tel:</b> 0115 84 68720<br/>
+<b>Address:</b><br/>Portland Building<br/>University Park<br/>Nottingham<br/>NG7 2RD</td></tr>
+</table></div>
+<div><img src="data:image/png;base64,{logo}" alt="TEC PA &amp; Lighting"/></div>
+</div>
+"""
+        self.result_header = ('<table class="box grid">\n'
+                              '<tr><td class="section-header">APPLIANCE DETAILS AND TEST RESULTS</td></tr>\n'
+                              '<tr><td class="key"><b>Key</b><br/>PASS / FAIL / INFO / N/A = Not Applicable</td></tr>\n'
+                              f'</table>{result_header}')
+
+    def tester_info(self, machine_info):
+        return (f'<table class="section box grid">\n'
+                f'<tr><td class="section-header" colspan="2">PAT TESTER INFO</td></tr>\n'
+                f'<tr class="key"><th>Serial Number</th><th>Make and Model</th></tr>\n'
+                f'<tr><td>{escape(machine_info.machine_serial_number)}</td>'
+                f'<td>{escape(machine_info.machine_model)}</td></tr>\n'
+                f'</table>\n')
+
+    def record_rows(self, formatted):
+        record = formatted.record
+        used_row = len(formatted)
+        fail_class = ' class="fail"' if formatted.failed else ''
+        failed_rows = set(formatted.failed_rows)
+
+        rows = []
+        for i, tr in enumerate(formatted.rows):
+            row_class = ' class="last"' if i == used_row - 1 else ''
+            cells = []
+            if i == 0:
+                cells.extend([
+                    f'<td rowspan="{used_row}"{fail_class}>{escape(record.asset_id)}</td>',
+                    f'<td rowspan="{used_row}"></td>',
+                    f'<td rowspan="{used_row}">{record.test_time.strftime("%d/%m/%Y")}</td>',
+                    f'<td rowspan="{used_row}">{escape(record.test_operator)}</td>',
+                    f'<td rowspan="{used_row}">{escape(record.program)}</td>',
+                ])
+            test_class = ' class="fail"' if i in failed_rows else ''
+            cells.extend(f'<td{test_class}>{escape(value)}</td>' for value in tr)
+            if i == 0:
+                cells.extend([
+                    f'<td rowspan="{used_row}"{fail_class}>{escape(record.get_status())}</td>',
+                    f'<td rowspan="{used_row}">{escape(record.comments)}</td>',
+                ])
+            rows.append(f'<tr{row_class}>{"".join(cells)}</tr>\n')
+        return ''.join(rows)
+
+    def render(self, file_path, machine_info, formatted_groups):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(self.head)
+            f.write(self.tec_info)
+            f.write(self.tester_info(machine_info))
+            f.write(self.result_header)
+
+            for location, formatted_records in formatted_groups.items():
+                # the failed count is only known once every record of the location is formatted, so its rows are
+                # held until the header can be written with it
+                rows = []
+                failed_counter = 0
+                for formatted in formatted_records:
+                    if formatted.failed:
+                        failed_counter += 1
+                    rows.append(self.record_rows(formatted))
+                f.write(f'<tbody>\n<tr><td class="location" colspan="11">{escape(location)} '
+                        f'({len(formatted_records)} Records in total, {failed_counter} FAILED)</td></tr>\n')
+                f.write(''.join(rows))
+                f.write('</tbody>\n')
+
+            f.write('</table>\n</body>\n</html>\n')
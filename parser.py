@@ -1,660 +1,272 @@
+import argparse
 import logging
-import os
 import sys
+from datetime import date, datetime
 
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, PatternFill
-from openpyxl.utils import get_column_letter
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, LongTable
-from tqdm import tqdm
-from yaspin import yaspin
+from pipeline import ReportPipeline, get_result_file_path
 
-from record_types import *
 
-
-def to_para(contents, style):
-    result = []
-    for content in contents:
-        result.append(Paragraph(content, style))
-    return result
+def log_time_msg(msg):
+    t = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"{t} INFO  - {msg}"
 
 
-def replace_sub(text):
-    if text == '':
-        return 'N/A'
-    else:
-        return text
+logger = logging.getLogger()
 
 
-def log_time_msg(msg):
-    t = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return f"{t} INFO  - {msg}"
+def setup_logging():
+    # only configured when run as a command, importing the pipeline leaves the caller's logging alone
+    logger.setLevel(logging.INFO)
+    console_handler = logging.StreamHandler()
+    formatter = logging.Formatter(
+        fmt='%(asctime)s %(levelname)-5s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
 
 
-def add_page_number(canvas, doc_instance):
-    canvas.saveState()
-    canvas.setFont('Helvetica', 8)
-    canvas.drawCentredString(A4[1] / 2, 0.5 * cm, f"Page {doc_instance.page}")
-    canvas.restoreState()
+commands = ('parse', 'validate', 'excel', 'pdf', 'export', 'html', 'snapshot', 'summary', 'diff')
 
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-console_handler = logging.StreamHandler()
-formatter = logging.Formatter(
-    fmt='%(asctime)s %(levelname)-5s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+def format_with_progress(pipeline, test_results):
+    # only the commands that render something pay for the progress bar imports
+    from tqdm import tqdm
+    from yaspin import yaspin
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1]
-        logger.info(f"Using .sss file: {file_path}")
-    else:
-        logger.critical("Usage: python parser.py <sss_file_path>")
-        exit()
-
-    f = open(file_path, 'rb')
-    test_results: List[TestResult] = []
-    machine_info = None
-
-    # parsing
-    while True:
-        start_byte = f.read(1)
-        assert start_byte == b'\x55'
-
-        record_length = f.read(2)
-        length_val = struct.unpack('<H', record_length)[0]
-        logger.debug(f'Found record, length = {length_val}')
-
-        checksum = f.read(2)
-        checksum_val = struct.unpack('<H', checksum)[0]
-
-        empty_byte = f.read(2)
-        assert empty_byte == b'\x00\x00'
-
-        # I don't know why but sometimes the length will short a little bit
-        record_content = f.read(length_val)
-        calculated_checksum = (sum(record_content)) & 0xffff
-        if calculated_checksum == checksum_val or calculated_checksum == checksum_val + 1:
-            logger.debug(f'Record checksum passed')
-        else:
-            length_val += 1
-            record_content += f.read(1)
-            calculated_checksum = (sum(record_content)) & 0xffff
-            assert calculated_checksum == checksum_val or calculated_checksum == checksum_val + 1
-            logger.debug(f'Record checksum passed')
-
-        record_type = record_content[0]
-        if record_type == 0xaa and record_content[1] == 0xff:
-            logger.info(f"Parsed {len(test_results)} record, ready to write")
-            break
-
-        instance = record_type_class_defs[record_type](record_content[1:])
-        if type(instance) is MachineInfo:
-            machine_info = instance
-        else:
-            test_results.append(instance)
-            test_results.append(instance)
-        logger.debug(f'Record content = {instance}')
-
-    result_file_path = f"{os.path.splitext(os.path.basename(file_path))[0]}_parsed_{datetime.now().strftime('%y_%m_%d_%H_%M_%S')}"
-    logger.info(f'Writing into Excel+PDF file...')
-
-    # %% Excel preparation
-    wb = Workbook()
-    ws = wb.active
-    fill = PatternFill(start_color="F56C6C", end_color="F56C6C", fill_type="solid")
-
-    # Instrument info
-    ws.append(
-        ["Test Instrument Model", "", "", machine_info.machine_model, "", "", "", "Test Instrument Serial Number", "",
-         "", machine_info.machine_serial_number, "", "", ""])
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-    ws.merge_cells(start_row=1, start_column=4, end_row=1, end_column=7)
-    ws.merge_cells(start_row=1, start_column=8, end_row=1, end_column=10)
-    ws.merge_cells(start_row=1, start_column=11, end_row=1, end_column=14)
-
-    # headers
-    headers = [
-        "Asset ID", "Site Name", "Location Name", "Test Time",
-        "Test Operator", "Overall Result", "Program", "Comments",
-        "Next Full Test Date", "Next Formal Visual Test Date", "Test Result"
-    ]
-    ws.append(headers)
-
-    # sub headers
-    sub_headers = ["", "", "", "", "", "", "", "", "", "", "Test Type", "Result", "Unit", "Status"]
-    ws.append(sub_headers)
-
-    for col in range(1, 11):
-        ws.merge_cells(start_row=2, start_column=col, end_row=3, end_column=col)
-    ws.merge_cells(start_row=2, start_column=11, end_row=2, end_column=14)
-
-    # %% PDF preparation
-    doc = SimpleDocTemplate(f"{result_file_path}.pdf",
-                            title='Portable Appliance Test (PAT) Report',
-                            pagesize=landscape(A4),
-                            rightMargin=1 * cm, leftMargin=1 * cm,
-                            topMargin=1 * cm, bottomMargin=1 * cm)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    style_section_header = ParagraphStyle(name='SectionHeader', parent=styles['Normal'], fontSize=9,
-                                          textColor=colors.white, fontName='Helvetica-Bold')
-    style_normal = ParagraphStyle(name='NormalText', parent=styles['Normal'], fontSize=8, fontName='Helvetica')
-    style_normal_centered = ParagraphStyle(name='NormalText', parent=styles['Normal'], fontSize=8, fontName='Helvetica',
-                                           alignment=TA_CENTER)
-    highlight_size = ParagraphStyle(name='normal_size_bold', parent=styles['Normal'], fontSize=10, fontName='Helvetica')
-
-    dark_blue = colors.Color(0.1, 0.2, 0.4)
-    light_grey = colors.Color(0.95, 0.95, 0.95)
-
-    header_row_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), dark_blue),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-    ]
-
-    elements.append(Paragraph("Portable Appliance Test (PAT) Report", ParagraphStyle(
-        name='HeaderTitle',
-        parent=styles['Normal'],
-        fontSize=16,
-        fontName='Helvetica-Bold',
-        leftIndent=-0.25 * cm
-    )))
-    elements.append(Spacer(1, 1 * cm))
-
-    # tec info
-    tec_info_table_content = [
-        [Paragraph("TESTING CARRIED OUT BY", style_section_header)],
-        [Paragraph("<b>TEC PA & Lighting</b>", highlight_size)],
-        [Paragraph("""<b>Email:</b> info@nottinghamtec.co.uk<br/>
-            <b>Website:</b> www.nottinghamtec.co.uk<br/>
-            <b>Tel:</b> 0115 84 68720<br/>
-            <b>Address:</b><br/>Portland Building<br/>University Park<br/>Nottingham<br/>NG7 2RD<br/>""", style_normal)]
-    ]
-    tec_info_table = Table(tec_info_table_content, colWidths=[doc.width / 2 - 1 * cm], )
-    tec_info_table.setStyle(TableStyle(header_row_style + [
-        ('BOX', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-
-    tec_logo = Image("imgs/combined-logo.png")
-    w, h = tec_info_table.wrap(doc.width / 2 - 1 * cm, doc.height)
-    target_height = h * 0.8
-    aspect_ratio = tec_logo.imageWidth / tec_logo.imageHeight
-    tec_logo.drawHeight = target_height
-    tec_logo.drawWidth = target_height * aspect_ratio
-
-    tec_info = Table(
-        [[tec_info_table, tec_logo]],
-        colWidths=[doc.width / 2, doc.width / 2],
-        hAlign='CENTER'
-    )
-    tec_info.setStyle(TableStyle([
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('VALIGN', (0, 0), (0, 0), 'TOP'),
-        ('VALIGN', (1, 0), (1, 0), 'MIDDLE'),
-        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-    ]))
-
-    elements.append(tec_info)
-    elements.append(Spacer(1, 0.5 * cm))
-
-    # tester info
-    tester_info_content = [
-        [Paragraph("PAT TESTER INFO", style_section_header), ""],
-        ["Serial Number", "Make and Model"],
-        [machine_info.machine_serial_number, machine_info.machine_model],
-    ]
-    tester_info_table = Table(tester_info_content, colWidths=[doc.width / 2, doc.width / 2])
-    tester_info_table.setStyle(TableStyle(
-        header_row_style +
-        [
-            ('SPAN', (0, 0), (1, 0))
-        ] +
-        [
-            ('GRID', (0, 1), (-1, -1), 0.5, colors.lightgrey),
-            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('BACKGROUND', (0, 1), (-1, 1), light_grey),
-            ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-        ] + [
-            ('BOX', (0, 0), (-1, -1), 1, colors.grey),
-        ]
-    ))
-    elements.append(tester_info_table)
-    elements.append(Spacer(1, 0.5 * cm))
-
-    # test result table header
-    result_header_content = [
-        [Paragraph("APPLIANCE DETAILS AND TEST RESULTS", style_section_header)],
-        [Paragraph("<b>Key</b><br/>PASS / FAIL / INFO / N/A = Not Applicable", style_normal)],
-    ]
-    result_header_table = Table(result_header_content, colWidths=[doc.width])
-    result_header_table.setStyle(TableStyle(
-        header_row_style +
-        [
-            ('BACKGROUND', (0, 1), (-1, -1), light_grey),
-            ('GRID', (0, 1), (-1, -1), 0.5, colors.lightgrey),
-            ('LINEABOVE', (0, 0), (-1, 0), 1, colors.grey),
-            ('LINEBEFORE', (0, 0), (0, -1), 1, colors.grey),
-            ('LINEAFTER', (0, 0), (0, -1), 1, colors.grey),
-        ]
-    ))
-    elements.append(result_header_table)
-
-    # data
-    result_header_to_be_repeated = [
-        ['Appliance ID', 'Appliance Description', 'Test Date', 'Operator', 'Program', 'Test Items', '', "", "",
-         "Overall Status", 'Comments'],
-        ['', '', '', '', '', 'Test Type', 'Result', "Unit", "Status", "", ''],
-    ]
-    result_content = []
-    result_style = []
-
-    # show records in different site/location seperately
-    locations = []
-    record_grouped_by_location = {}
-    for record in test_results:
-        location = f"{record.site_name} - {record.location_name}"
-        if location not in locations:
-            locations.append(location)
-            record_grouped_by_location[location] = []
-        record_grouped_by_location[location].append(record)
-
-    current_row_excel = 4
-    current_row_pdf = 2
+    record_grouped_by_location = pipeline.group(test_results)
     with yaspin(text="Formatting Result", color="black") as spinner:
-        with tqdm(total=sum(len(l) for _, l in record_grouped_by_location.items()), desc="Progress", position=1,
-                  leave=False,
+        with tqdm(total=len(test_results), desc="Progress", position=1, leave=False,
                   bar_format="{l_bar} {bar}| {n}/{total}") as pbar:
-            for location, records in record_grouped_by_location.items():
-                # add a placeholder for site title because also want to add failed test number
-                header_idx = len(result_content)
-                result_content.append('')
-                result_style.extend([
-                    ('BACKGROUND', (0, current_row_pdf), (-1, current_row_pdf), dark_blue),
-                    ('TEXTCOLOR', (0, current_row_pdf), (-1, current_row_pdf), colors.white),
-                    ('SPAN', (0, current_row_pdf), (-1, current_row_pdf)),
-                ])
-                current_row_pdf += 1
-                failed_counter = 0
-
-                for record in records:
-                    formatted_results = []
-                    used_row = 0
-                    merge_row = []
-                    failed_row = []
-                    original_result_style_len = len(result_style)
-
-                    for visual_test_result in record.visual_test_results:
-                        formatted_results.append([
-                            visual_test_result.name,
-                            visual_test_result.result if visual_test_result.unit else "",
-                            visual_test_result.unit,
-                            visual_test_result.flags[0]
-                        ])
-                        if not visual_test_result.unit:
-                            merge_row.append(current_row_excel + used_row)
-                        if visual_test_result.flags[0] == 'FAIL':
-                            failed_row.append(current_row_excel + used_row)
-                            result_style.append(
-                                ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row),
-                                 colors.Color(0.99, 0.88, 0.88))
-                            )
-
-                        used_row += 1
-                    for physical_test_result in record.physical_test_results:
-                        if isinstance(physical_test_result, EarthResistanceTestResult):
-                            formatted_results.append([
-                                "Earth Continuity",
-                                physical_test_result.get_value(),
-                                physical_test_result.resistance.unit,
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(current_row_excel + used_row)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-
-                            used_row += 1
-                        elif isinstance(physical_test_result, IECLeadContinuityTestResult):
-                            formatted_results.append([
-                                "IEC Lead Continuity",
-                                physical_test_result.get_value(),
-                                physical_test_result.resistance.unit,
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(current_row_excel + used_row)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-
-                            used_row += 1
-                        elif isinstance(physical_test_result, PointToPointTestResult):
-                            formatted_results.append([
-                                "Point To Point Resistance",
-                                physical_test_result.get_value(),
-                                physical_test_result.resistance.unit,
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(current_row_excel + used_row)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-
-                            used_row += 1
-                        elif isinstance(physical_test_result, InsulationTestResult):
-                            formatted_results.append([
-                                "Insulation",
-                                physical_test_result.get_value(),
-                                physical_test_result.resistance.unit,
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(current_row_excel + used_row)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-
-                            formatted_results.append([
-                                "Insulation Voltage",
-                                physical_test_result.voltage.value,
-                                physical_test_result.voltage.unit,
-                                "INFO"
-                            ])
-                            used_row += 2
-                        elif isinstance(physical_test_result, SubstituteLeakageTestResult):
-                            formatted_results.append([
-                                "Substitute Leakage Current",
-                                physical_test_result.get_value(),
-                                physical_test_result.current.unit,
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(current_row_excel + used_row)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-
-                            used_row += 1
-                        elif isinstance(physical_test_result, PolarityTestResult):
-                            merge_row.append(current_row_excel + used_row)
-                            formatted_results.append([
-                                "IEC Lead Polarity",
-                                physical_test_result.get_value(),
-                                "",
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(current_row_excel + used_row)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-
-                            used_row += 1
-                        elif isinstance(physical_test_result, MainVoltageTestResult):
-                            formatted_results.append([
-                                "Main Voltage",
-                                physical_test_result.get_value(),
-                                physical_test_result.voltage.unit,
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(current_row_excel + used_row)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-
-                            used_row += 1
-                        elif isinstance(physical_test_result, TouchOrLeakageCurrentTestResult):
-                            formatted_results.append([
-                                "Touch Or Leakage Test Load Current",
-                                physical_test_result.load_current.value,
-                                physical_test_result.load_current.unit,
-                                physical_test_result.get_status()
-                            ])
-                            formatted_results.append([
-                                "Touch Or Leakage Test Leakage Current",
-                                physical_test_result.leakage_current.value,
-                                physical_test_result.leakage_current.unit,
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(current_row_excel + used_row)
-                                failed_row.append(current_row_excel + used_row + 1)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row), (8, current_row_pdf + used_row + 1),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-                            used_row += 2
-                        elif isinstance(physical_test_result, RCDTestResult):
-                            formatted_results.append([
-                                "RCD Test Current",
-                                physical_test_result.test_current.value,
-                                physical_test_result.test_current.unit,
-                                "INFO"
-                            ])
-                            formatted_results.append([
-                                "RCD Test Circle Angle",
-                                physical_test_result.circle_angle.value,
-                                physical_test_result.circle_angle.unit,
-                                "INFO"
-                            ])
-                            formatted_results.append([
-                                "RCD Test Trip time",
-                                physical_test_result.get_value(),
-                                physical_test_result.trip_time.unit,
-                                physical_test_result.get_status()
-                            ])
-                            if physical_test_result.get_status() == 'FAIL':
-                                failed_row.append(used_row + 2)
-                                result_style.append(
-                                    ('BACKGROUND', (5, current_row_pdf + used_row + 2),
-                                     (8, current_row_pdf + used_row + 2),
-                                     colors.Color(0.99, 0.88, 0.88))
-                                )
-                            used_row += 3
-                        elif isinstance(physical_test_result, StringComment):
-                            merge_row.append(current_row_excel + used_row)
-                            formatted_results.append([
-                                physical_test_result.string_value,
-                                "",
-                                "",
-                                physical_test_result.get_status()
-                            ])
-                            used_row += 1
-
-                    if not len(result_style) == original_result_style_len:
-                        result_style.extend(
-                            [
-                                ('BACKGROUND', (0, current_row_pdf), (0, current_row_pdf + used_row - 1),
-                                 colors.Color(0.99, 0.88, 0.88)),
-                                ('BACKGROUND', (9, current_row_pdf), (9, current_row_pdf + used_row - 1),
-                                 colors.Color(0.99, 0.88, 0.88)),
-                            ]
-                        )
-                        failed_counter += 1
-
-                    for i, tr in enumerate(formatted_results):
-                        tr[0] = replace_sub(str(tr[0]))
-                        tr[1] = replace_sub(str(tr[1]))
-                        tr[2] = replace_sub(str(tr[2]).lower())
-                        tr[3] = replace_sub(str(tr[3]))
-
-                        # excel
-                        row = []
-                        if i == 0:
-                            row.extend([
-                                record.asset_id,
-                                record.site_name,
-                                record.location_name,
-                                record.test_time,
-                                record.test_operator,
-                                record.get_status(),
-                                record.program,
-                                record.comments,
-                                record.next_full_test_date,
-                                record.next_formal_visual_test_date
-                            ])
-                        else:
-                            row.extend([""] * 10)
-
-                        # pdf
-                        row.extend(tr)
-                        ws.append(row)
-
-                        row = []
-                        if i == 0:
-                            row.extend([
-                                record.asset_id,
-                                '',
-                                record.test_time.strftime("%d/%m/%Y"),
-                                record.test_operator,
-                                record.program,
-                            ])
-                            row.extend(tr)
-                            row.extend([
-                                record.get_status(),
-                                record.comments
-                            ])
-                        else:
-                            row.extend([""] * 5)
-                            row.extend(tr)
-                            row.extend([""] * 2)
-
-                        result_content.append(to_para(row, style_normal_centered))
-
-                    # merge information cols
-                    if used_row > 1:
-                        for col in range(1, 11):
-                            ws.merge_cells(
-                                start_row=current_row_excel,
-                                start_column=col,
-                                end_row=current_row_excel + used_row - 1,
-                                end_column=col
-                            )
-                    for i in merge_row:
-                        ws.merge_cells(
-                            start_row=i,
-                            start_column=12,
-                            end_row=i,
-                            end_column=13
-                        )
-
-                    # highlight fail cells
-                    if len(failed_row) > 0:
-                        ws.cell(row=current_row_excel, column=1).fill = fill
-                        for row in failed_row:
-                            for col in range(11, 15):
-                                ws.cell(row=row, column=col).fill = fill
-
-                    # pdf, add divider lines
-                    for i in range(current_row_pdf, current_row_pdf + used_row):
-                        result_style.extend([
-                            ('LINEBELOW', (5, i), (8, i), 0.5, colors.lightgrey),
-                        ])
-                    result_style.extend([
-                        ('LINEBELOW', (0, current_row_pdf + used_row - 1), (-1, current_row_pdf + used_row - 1), 1,
-                         colors.grey),
-                    ])
-
-                    current_row_excel += used_row
-                    current_row_pdf += used_row
-                    pbar.update(1)
-
-                # update placeholder created before
-                result_content[header_idx] = to_para(
-                    [f"{location} ({len(records)} Records in total, {failed_counter} FAILED)"] + [''] * 10,
-                    style_section_header)
-
+            formatted_groups = pipeline.format(record_grouped_by_location, on_record=lambda _: pbar.update(1))
         spinner.ok(log_time_msg("✔"))
+    return formatted_groups
 
-    with yaspin(text="Generating Excel File...", color="black") as spinner:
-        for row in ws.iter_rows():
-            for cell in row:
-                cell.alignment = Alignment(horizontal="center", vertical="center")
 
-        for col in ws.columns:
-            max_length = 0
-            col_letter = get_column_letter(col[0].column)
-            for cell in col:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            ws.column_dimensions[col_letter].width = max_length + 2
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
 
-        wb.save(f"{result_file_path}.xlsx")
-        spinner.ok(log_time_msg("✔"))
 
-    result_table = LongTable(result_header_to_be_repeated + result_content, colWidths=[
-        3 * cm,
-        6 * cm,
-        2 * cm,
-        2 * cm,
-        2.5 * cm,
-        3 * cm, 1.75 * cm, 1.25 * cm, 1.5 * cm,
-        2.5 * cm,
-        2.2 * cm
-    ], repeatRows=2)
-    result_table.setStyle(TableStyle(
-        [
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, 1), 0.5, colors.lightgrey),
-            ('LINEBELOW', (0, -1), (-1, -1), 1, colors.grey),
-            ('LINEBEFORE', (0, 0), (0, -1), 1, colors.grey),
-            ('LINEAFTER', (10, 0), (10, -1), 1, colors.grey),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LINEBELOW', (0, 1), (-1, 1), 1, colors.grey),
-
-            ('LINEAFTER', (0, 2), (0, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (1, 2), (1, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (2, 2), (2, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (3, 2), (3, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (4, 2), (4, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (5, 2), (5, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (6, 2), (6, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (7, 2), (7, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (8, 2), (8, -1), 0.5, colors.lightgrey),
-            ('LINEAFTER', (9, 2), (9, -1), 0.5, colors.lightgrey),
-
-            ('SPAN', (5, 0), (8, 0)),
-            ('SPAN', (0, 0), (0, 1)),
-            ('SPAN', (1, 0), (1, 1)),
-            ('SPAN', (2, 0), (2, 1)),
-            ('SPAN', (3, 0), (3, 1)),
-            ('SPAN', (4, 0), (4, 1)),
-            ('SPAN', (9, 0), (9, 1)),
-            ('SPAN', (10, 0), (10, 1)),
-            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
-            ('BACKGROUND', (0, 0), (-1, 1), light_grey),
-        ] + result_style
-    ))
-    elements.append(result_table)
-
-    with yaspin(text="Generating PDF File...", color="black") as spinner:
-        doc.build(elements, onFirstPage=add_page_number, onLaterPages=add_page_number)
-        spinner.ok(log_time_msg("✔"))
+def iso_time(value):
+    # a bare date is kept as a date, so --to 2025-09-28 includes the whole day
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def get_record_filter(args):
+    if args.status is None and args.site is None and args.location is None and args.start is None \
+            and args.end is None:
+        return None
+
+    from sss_reader import RecordFilter
+
+    return RecordFilter(statuses=args.status, site_names=args.site, location_names=args.location,
+                        start_time=args.start, end_time=args.end)
+
+
+def run_validate(args):
+    machine_info, test_results = ReportPipeline().parse(args.files, record_filter=get_record_filter(args))
+    logger.info(f"{', '.join(args.files)} valid, "
+                f"tester = {machine_info.machine_model} {machine_info.machine_serial_number}, "
+                f"total records = {len(test_results)}")
+
+
+def run_snapshot(args):
+    pipeline = ReportPipeline()
+    machine_info, test_results = pipeline.parse(args.files, record_filter=get_record_filter(args))
+    file_path = pipeline.write_snapshot(get_result_file_path(args.files[0]), machine_info, test_results)
+    logger.info(f"Snapshot has been written to {file_path}, total records = {len(test_results)}")
+
+
+def run_summary(args):
+    from fleet_summary import summarize_files
+
+    machine_info, summary = summarize_files(args.files, record_filter=get_record_filter(args), workers=args.workers)
+    text = summary.render_text(machine_info, as_of=args.as_of)
+    file_path = f"{get_result_file_path(args.files[0])}_summary.txt"
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    print(text)
+    logger.info(f"Summary has been written to {file_path}")
+
+
+def run_diff(args):
+    from session_diff import diff_files, write_diff_report
+
+    thresholds = {'Earth Resistance (ohm)': args.earth_drift, 'Insulation Resistance (mohm)': args.insulation_drift}
+    diffs, fleet = diff_files(args.files, {name: value for name, value in thresholds.items() if value is not None},
+                              record_filter=get_record_filter(args))
+    file_path = f"{get_result_file_path(args.files[-1])}_diff.xlsx"
+    write_diff_report(file_path, diffs, fleet, due_start=args.due_from, due_end=args.due_to)
+    for diff in diffs:
+        logger.info(f"{diff.old_name} -> {diff.new_name}: {len(diff.new)} new, {len(diff.missing)} missing, "
+                    f"{len(diff.newly_failed)} PASS -> FAIL, {len(diff.drifts)} drifted")
+    logger.info(f"Diff has been written to {file_path}")
+
+
+def run_export(args, excel=True, pdf=True, html=False):
+    from yaspin import yaspin
+
+    excel_styling = getattr(args, 'excel_styling', 'cells')
+    pipeline = ReportPipeline(excel=excel, pdf=pdf, html=html, excel_styling=excel_styling)
+
+    if args.async_ingest:
+        from async_ingest import ingest
+
+        # every report is logged by ingest() as soon as it is written
+        ingest(args.files, excel=excel, pdf=pdf, html=html, excel_styling=excel_styling,
+               record_filter=get_record_filter(args), decoders=args.workers)
+        return
+
+    if args.each:
+        with yaspin(text="Generating reports...", color="black") as spinner:
+            written = pipeline.run_batch(args.files, record_filter=get_record_filter(args))
+            spinner.ok(log_time_msg("✔"))
+        for source_name, file_paths in written.items():
+            logger.info(f"{source_name} has been written to {', '.join(file_paths)}")
+        return
+
+    machine_info, test_results = pipeline.parse(args.files, record_filter=get_record_filter(args))
+    result_file_path = get_result_file_path(args.files[0])
+
+    if args.shard_by is not None or args.shard_size is not None:
+        from sharded_report import render_shards
+
+        index_file_path, shards = render_shards(result_file_path, machine_info, test_results,
+                                                shard_by=args.shard_by, shard_size=args.shard_size,
+                                                excel=excel, pdf=pdf, html=html, workers=args.workers,
+                                                excel_styling=excel_styling)
+        logger.info(f"All test results have been written to {len(shards)} shards, index = {index_file_path}, "
+                    f"total records = {len(test_results)}")
+        return
+
+    if excel or pdf:
+        formatted_groups = format_with_progress(pipeline, test_results)
+    else:
+        formatted_groups = pipeline.format(pipeline.group(test_results))
+
+    written = []
+    if excel:
+        with yaspin(text="Generating Excel File...", color="black") as spinner:
+            pipeline.render_excel(result_file_path, machine_info, formatted_groups)
+            spinner.ok(log_time_msg("✔"))
+        written.append('xlsx')
+    if pdf:
+        with yaspin(text="Generating PDF File...", color="black") as spinner:
+            pipeline.render_pdf(result_file_path, machine_info, formatted_groups)
+            spinner.ok(log_time_msg("✔"))
+        written.append('pdf')
+    if html:
+        with yaspin(text="Generating HTML File...", color="black") as spinner:
+            pipeline.render_html(result_file_path, machine_info, formatted_groups)
+            spinner.ok(log_time_msg("✔"))
+        written.append('html')
 
     logger.info(
-        f"All test results have been written to {result_file_path}.xlsx/pdf, total records = {len(test_results)}")
+        f"All test results have been written to {result_file_path}.{'/'.join(written)}, "
+        f"total records = {len(test_results)}")
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(prog='parser.py', description='Seaward .sss test file parser')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    validate_parser = subparsers.add_parser('parse', aliases=['validate'], help='parse and validate a .sss file only')
+    validate_parser.set_defaults(func=run_validate)
+
+    excel_parser = subparsers.add_parser('excel', help='write the Excel report')
+    excel_parser.set_defaults(func=lambda args: run_export(args, excel=True, pdf=False))
+
+    pdf_parser = subparsers.add_parser('pdf', help='write the PDF report')
+    pdf_parser.set_defaults(func=lambda args: run_export(args, excel=False, pdf=True))
+
+    export_parser = subparsers.add_parser('export', help='write both the Excel and PDF reports')
+    export_parser.set_defaults(func=run_export)
+
+    html_parser = subparsers.add_parser('html', help='write a quick HTML preview with the layout of the PDF report')
+    html_parser.set_defaults(func=lambda args: run_export(args, excel=False, pdf=False, html=True))
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='write a .sssnap snapshot that reports can be re-rendered '
+                                                             'from without parsing the .sss files again')
+    snapshot_parser.set_defaults(func=run_snapshot)
+
+    summary_parser = subparsers.add_parser('summary', help='write a short fleet summary: counts, fail rates, '
+                                                           'measurement distributions and overdue assets')
+    summary_parser.set_defaults(func=run_summary)
+    summary_parser.add_argument('--as-of', type=datetime.fromisoformat,
+                                help='count assets due for a full test before this time as overdue, defaults to now')
+    summary_parser.add_argument('--workers', type=positive_int,
+                                help='processes decoding and summarizing records, defaults to the CPU count')
+
+    diff_parser = subparsers.add_parser('diff', help='diff each session against the one before it: new and missing '
+                                                     'assets, status changes, drifted readings and retests due')
+    diff_parser.set_defaults(func=run_diff)
+    diff_parser.add_argument('--earth-drift', type=float,
+                             help='report earth resistance changes above this many ohm, default 0.1')
+    diff_parser.add_argument('--insulation-drift', type=float,
+                             help='report insulation resistance changes above this many mohm, default 5')
+    diff_parser.add_argument('--due-from', type=datetime.fromisoformat,
+                             help='start of the retest due window, defaults to now')
+    diff_parser.add_argument('--due-to', type=datetime.fromisoformat,
+                             help='end of the retest due window, defaults to 30 days after its start')
+
+    for subparser in (validate_parser, excel_parser, pdf_parser, export_parser, html_parser, snapshot_parser,
+                      summary_parser, diff_parser):
+        subparser.add_argument('files', nargs='+', metavar='file',
+                               help='path to a .sss file, or a .gz/.bz2/.xz compressed one, or a .zip of .sss files, '
+                                    'or a .sssnap snapshot')
+        subparser.add_argument('--status', action='append', choices=['PASS', 'FAIL', 'INFO', 'UNKNOWN'],
+                               help='only keep records with this overall status, can be repeated')
+        subparser.add_argument('--site', action='append', help='only keep records of this site, can be repeated')
+        subparser.add_argument('--location', action='append',
+                               help='only keep records of this location, can be repeated')
+        subparser.add_argument('--from', dest='start', type=iso_time,
+                               help='only keep records tested at or after this time, e.g. 2025-09-28T12:00')
+        subparser.add_argument('--to', dest='end', type=iso_time,
+                               help='only keep records tested at or before this time, a date includes the whole day')
+
+    for subparser in (excel_parser, pdf_parser, export_parser, html_parser):
+        subparser.add_argument('--shard-by', choices=['site', 'location'],
+                               help='write one report per site or per site/location, plus an index workbook')
+        subparser.add_argument('--shard-size', type=positive_int,
+                               help='start a new report after this many records, plus an index workbook')
+        subparser.add_argument('--workers', type=positive_int,
+                               help='processes rendering shards (defaults to the CPU count) or decoding with --async')
+        subparser.add_argument('--each', action='store_true',
+                               help='write one report per .sss file or archive member instead of a combined one')
+        subparser.add_argument('--async', dest='async_ingest', action='store_true',
+                               help='like --each, reading, decoding and rendering the files concurrently')
+
+    for subparser in (excel_parser, export_parser):
+        subparser.add_argument('--excel-styling', choices=['cells', 'conditional'], default='cells',
+                               help='cells: fill and align every cell (default), conditional: centered default cell '
+                                    'format and conditional formatting for FAIL, smaller and faster on large reports')
+
+    return arg_parser
+
+
+def main(argv=None):
+    setup_logging()
+    argv = sys.argv[1:] if argv is None else argv
+    # keep `python parser.py <sss_file_path>` working, it means export
+    if len(argv) > 0 and argv[0] not in commands and not argv[0].startswith('-'):
+        argv = ['export'] + argv
+
+    arg_parser = build_arg_parser()
+    args = arg_parser.parse_args(argv)
+    if (getattr(args, 'each', False) or getattr(args, 'async_ingest', False)) and \
+            (args.shard_by is not None or args.shard_size is not None):
+        arg_parser.error('--each/--async cannot be combined with --shard-by/--shard-size')
+    if args.command == 'diff' and len(args.files) < 2:
+        arg_parser.error('diff needs at least two sessions')
+    logger.info(f"Using .sss file: {', '.join(args.files)}")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import os
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, LongTable
+
+
+def to_para(contents, style):
+    result = []
+    for content in contents:
+        result.append(Paragraph(content, style))
+    return result
+
+
+def add_page_number(canvas, doc_instance):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.drawCentredString(A4[1] / 2, 0.5 * cm, f"Page {doc_instance.page}")
+    canvas.restoreState()
+
+
+page_size = landscape(A4)
+page_margin = 1 * cm
+doc_width = page_size[0] - 2 * page_margin
+doc_height = page_size[1] - 2 * page_margin
+logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imgs', 'combined-logo.png')
+
+dark_blue = colors.Color(0.1, 0.2, 0.4)
+light_grey = colors.Color(0.95, 0.95, 0.95)
+light_red = colors.Color(0.99, 0.88, 0.88)
+
+result_col_widths = [
+    3 * cm,
+    6 * cm,
+    2 * cm,
+    2 * cm,
+    2.5 * cm,
+    3 * cm, 1.75 * cm, 1.25 * cm, 1.5 * cm,
+    2.5 * cm,
+    2.2 * cm
+]
+
+
+class PdfReportRenderer:
+    """
+    Builds the styles, the TEC info block (with the logo) and the static table headers once, every call to render()
+    reuses them, so one renderer can produce many reports in a single process.
+    """
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+
+        self.style_section_header = ParagraphStyle(name='SectionHeader', parent=styles['Normal'], fontSize=9,
+                                                   textColor=colors.white, fontName='Helvetica-Bold')
+        self.style_normal = ParagraphStyle(name='NormalText', parent=styles['Normal'], fontSize=8,
+                                           fontName='Helvetica')
+        self.style_normal_centered = ParagraphStyle(name='NormalText', parent=styles['Normal'], fontSize=8,
+                                                    fontName='Helvetica', alignment=TA_CENTER)
+        self.highlight_size = ParagraphStyle(name='normal_size_bold', parent=styles['Normal'], fontSize=10,
+                                             fontName='Helvetica')
+
+        self.header_row_style = [
+            ('BACKGROUND', (0, 0), (-1, 0), dark_blue),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ]
+
+        self.title = Paragraph("Portable Appliance Test (PAT) Report", ParagraphStyle(
+            name='HeaderTitle',
+            parent=styles['Normal'],
+            fontSize=16,
+            fontName='Helvetica-Bold',
+            leftIndent=-0.25 * cm
+        ))
+        self.tec_info = self.build_tec_info()
+        self.result_header_table = self.build_result_header_table()
+        self.result_header_to_be_repeated = [
+            ['Appliance ID', 'Appliance Description', 'Test Date', 'Operator', 'Program', 'Test Items', '', "", "",
+             "Overall Status", 'Comments'],
+            ['', '', '', '', '', 'Test Type', 'Result', "Unit", "Status", "", ''],
+        ]
+        self.result_table_style = [
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, 1), 0.5, colors.lightgrey),
+            ('LINEBELOW', (0, -1), (-1, -1), 1, colors.grey),
+            ('LINEBEFORE', (0, 0), (0, -1), 1, colors.grey),
+            ('LINEAFTER', (10, 0), (10, -1), 1, colors.grey),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LINEBELOW', (0, 1), (-1, 1), 1, colors.grey),
+
+            ('LINEAFTER', (0, 2), (0, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (1, 2), (1, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (2, 2), (2, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (3, 2), (3, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (4, 2), (4, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (5, 2), (5, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (6, 2), (6, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (7, 2), (7, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (8, 2), (8, -1), 0.5, colors.lightgrey),
+            ('LINEAFTER', (9, 2), (9, -1), 0.5, colors.lightgrey),
+
+            ('SPAN', (5, 0), (8, 0)),
+            ('SPAN', (0, 0), (0, 1)),
+            ('SPAN', (1, 0), (1, 1)),
+            ('SPAN', (2, 0), (2, 1)),
+            ('SPAN', (3, 0), (3, 1)),
+            ('SPAN', (4, 0), (4, 1)),
+            ('SPAN', (9, 0), (9, 1)),
+            ('SPAN', (10, 0), (10, 1)),
+            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, 0), (-1, 1), light_grey),
+        ]
+
+    def build_tec_info(self):
+        tec_info_table_content = [
+            [Paragraph("TESTING CARRIED OUT BY", self.style_section_header)],
+            [Paragraph("<b>TEC PA & Lighting</b>", self.highlight_size)],
+            [Paragraph("""<b>Email:</b> info@nottinghamtec.co.uk<br/>
+                <b>Website:</b> www.nottinghamtec.co.uk<br/>
+                <b>Tel:</b> 0115 84 68720<br/>
+                <b>Address:</b><br/>Portland Building<br/>University Park<br/>Nottingham<br/>NG7 2RD<br/>""",
+                       self.style_normal)]
+        ]
+        tec_info_table = Table(tec_info_table_content, colWidths=[doc_width / 2 - 1 * cm], )
+        tec_info_table.setStyle(TableStyle(self.header_row_style + [
+            ('BOX', (0, 0), (-1, -1), 1, colors.grey),
+        ]))
+
+        tec_logo = Image(logo_path)
+        w, h = tec_info_table.wrap(doc_width / 2 - 1 * cm, doc_height)
+        target_height = h * 0.8
+        aspect_ratio = tec_logo.imageWidth / tec_logo.imageHeight
+        tec_logo.drawHeight = target_height
+        tec_logo.drawWidth = target_height * aspect_ratio
+
+        tec_info = Table(
+            [[tec_info_table, tec_logo]],
+            colWidths=[doc_width / 2, doc_width / 2],
+            hAlign='CENTER'
+        )
+        tec_info.setStyle(TableStyle([
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('VALIGN', (0, 0), (0, 0), 'TOP'),
+            ('VALIGN', (1, 0), (1, 0), 'MIDDLE'),
+            ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+        ]))
+        return tec_info
+
+    def build_result_header_table(self):
+        result_header_content = [
+            [Paragraph("APPLIANCE DETAILS AND TEST RESULTS", self.style_section_header)],
+            [Paragraph("<b>Key</b><br/>PASS / FAIL / INFO / N/A = Not Applicable", self.style_normal)],
+        ]
+        result_header_table = Table(result_header_content, colWidths=[doc_width])
+        result_header_table.setStyle(TableStyle(
+            self.header_row_style +
+            [
+                ('BACKGROUND', (0, 1), (-1, -1), light_grey),
+                ('GRID', (0, 1), (-1, -1), 0.5, colors.lightgrey),
+                ('LINEABOVE', (0, 0), (-1, 0), 1, colors.grey),
+                ('LINEBEFORE', (0, 0), (0, -1), 1, colors.grey),
+                ('LINEAFTER', (0, 0), (0, -1), 1, colors.grey),
+            ]
+        ))
+        return result_header_table
+
+    def build_tester_info(self, machine_info):
+        tester_info_content = [
+            [Paragraph("PAT TESTER INFO", self.style_section_header), ""],
+            ["Serial Number", "Make and Model"],
+            [machine_info.machine_serial_number, machine_info.machine_model],
+        ]
+        tester_info_table = Table(tester_info_content, colWidths=[doc_width / 2, doc_width / 2])
+        tester_info_table.setStyle(TableStyle(
+            self.header_row_style +
+            [
+                ('SPAN', (0, 0), (1, 0))
+            ] +
+            [
+                ('GRID', (0, 1), (-1, -1), 0.5, colors.lightgrey),
+                ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+                ('BACKGROUND', (0, 1), (-1, 1), light_grey),
+                ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+            ] + [
+                ('BOX', (0, 0), (-1, -1), 1, colors.grey),
+            ]
+        ))
+        return tester_info_table
+
+    def build_result_table(self, formatted_groups):
+        result_content = []
+        result_style = []
+
+        current_row_pdf = 2
+        for location, formatted_records in formatted_groups.items():
+            # add a placeholder for site title because also want to add failed test number
+            header_idx = len(result_content)
+            result_content.append('')
+            result_style.extend([
+                ('BACKGROUND', (0, current_row_pdf), (-1, current_row_pdf), dark_blue),
+                ('TEXTCOLOR', (0, current_row_pdf), (-1, current_row_pdf), colors.white),
+                ('SPAN', (0, current_row_pdf), (-1, current_row_pdf)),
+            ])
+            current_row_pdf += 1
+            failed_counter = 0
+
+            for formatted in formatted_records:
+                record = formatted.record
+                used_row = len(formatted)
+
+                for i in formatted.failed_rows:
+                    result_style.append(
+                        ('BACKGROUND', (5, current_row_pdf + i), (8, current_row_pdf + i), light_red)
+                    )
+                if formatted.failed:
+                    result_style.extend(
+                        [
+                            ('BACKGROUND', (0, current_row_pdf), (0, current_row_pdf + used_row - 1), light_red),
+                            ('BACKGROUND', (9, current_row_pdf), (9, current_row_pdf + used_row - 1), light_red),
+                        ]
+                    )
+                    failed_counter += 1
+
+                for i, tr in enumerate(formatted.rows):
+                    if i == 0:
+                        row = [
+                            record.asset_id,
+                            '',
+                            record.test_time.strftime("%d/%m/%Y"),
+                            record.test_operator,
+                            record.program,
+                        ]
+                        row.extend(tr)
+                        row.extend([
+                            record.get_status(),
+                            record.comments
+                        ])
+                    else:
+                        row = [""] * 5
+                        row.extend(tr)
+                        row.extend([""] * 2)
+
+                    result_content.append(to_para(row, self.style_normal_centered))
+
+                # pdf, add divider lines
+                for i in range(current_row_pdf, current_row_pdf + used_row):
+                    result_style.extend([
+                        ('LINEBELOW', (5, i), (8, i), 0.5, colors.lightgrey),
+                    ])
+                result_style.extend([
+                    ('LINEBELOW', (0, current_row_pdf + used_row - 1), (-1, current_row_pdf + used_row - 1), 1,
+                     colors.grey),
+                ])
+
+                current_row_pdf += used_row
+
+            # update placeholder created before
+            result_content[header_idx] = to_para(
+                [f"{location} ({len(formatted_records)} Records in total, {failed_counter} FAILED)"] + [''] * 10,
+                self.style_section_header)
+
+        result_table = LongTable(self.result_header_to_be_repeated + result_content, colWidths=result_col_widths,
+                                 repeatRows=2)
+        result_table.setStyle(TableStyle(self.result_table_style + result_style))
+        return result_table
+
+    def render(self, file_path, machine_info, formatted_groups):
+        doc = SimpleDocTemplate(file_path,
+                                title='Portable Appliance Test (PAT) Report',
+                                pagesize=page_size,
+                                rightMargin=page_margin, leftMargin=page_margin,
+                                topMargin=page_margin, bottomMargin=page_margin)
+        elements = [
+            self.title,
+            Spacer(1, 1 * cm),
+            self.tec_info,
+            Spacer(1, 0.5 * cm),
+            self.build_tester_info(machine_info),
+            Spacer(1, 0.5 * cm),
+            self.result_header_table,
+            self.build_result_table(formatted_groups),
+        ]
+        doc.build(elements, onFirstPage=add_page_number, onLaterPages=add_page_number)
@@ -0,0 +1,216 @@
+import logging
+import os
+import re
+from datetime import datetime
+
+from record_types import StringDictionary
+from report_format import group_by_location, format_groups, format_groups_lazily
+from sss_reader import RecordDeduplicator, compression_openers, open_sources, parse_files, parse_stream
+
+logger = logging.getLogger()
+snapshot_ext = '.sssnap'
+
+
+def is_snapshot(file_path):
+    return file_path.lower().endswith(snapshot_ext)
+
+
+def get_result_file_path(file_path, output_dir=''):
+    # archive members are named <archive>:<member>, the member names the report
+    stem, ext = os.path.splitext(os.path.basename(file_path.rsplit(':', 1)[-1]))
+    while ext.lower() in compression_openers or ext.lower() in ('.sss', '.zip', snapshot_ext):
+        stem, ext = os.path.splitext(stem)
+    # re-rendering a snapshot should not stack a second _parsed_<time> suffix
+    stem = re.sub(r'_parsed_\d{2}(_\d{2}){5}$', '', f"{stem}{ext}")
+    name = f"{stem}_parsed_{datetime.now().strftime('%y_%m_%d_%H_%M_%S')}"
+    return os.path.join(output_dir, name)
+
+
+def parse_snapshot(file_path, record_filter=None):
+    # the snapshot records are already decoded, the filter is applied to them instead of to raw header bytes
+    from snapshot import load_snapshot
+
+    machine_info, test_results = load_snapshot(file_path)
+    logger.info(f"Loaded {len(test_results)} record from snapshot {file_path}")
+    if record_filter is not None:
+        skipped_before = record_filter.skipped
+        test_results = [record for record in test_results if record_filter.matches_record(record)]
+        logger.info(f"Skipped {record_filter.skipped - skipped_before} record not matching the filter")
+    return machine_info, test_results
+
+
+class ReportPipeline:
+    """
+    In-process parse -> group -> format -> render pipeline.
+
+    The renderers are created on first use and kept, so their styles and fixed assets are built once however many
+    reports the pipeline renders, e.g.
+
+        pipeline = ReportPipeline(excel=True, pdf=True)
+        for path in sss_files:
+            pipeline.run(path, output_dir='reports')
+    """
+
+    def __init__(self, excel=True, pdf=True, deduplicator=None, html=False, excel_styling='cells'):
+        self.excel = excel
+        self.pdf = pdf
+        self.html = html
+        # see excel_report.ExcelReportRenderer, 'conditional' writes smaller workbooks faster
+        self.excel_styling = excel_styling
+        # pass a RecordDeduplicator to also drop records already seen by earlier runs of this pipeline
+        self.deduplicator = deduplicator
+        self._excel_renderer = None
+        self._pdf_renderer = None
+        self._html_renderer = None
+
+    @property
+    def excel_renderer(self):
+        if self._excel_renderer is None:
+            from excel_report import ExcelReportRenderer
+            self._excel_renderer = ExcelReportRenderer(styling=self.excel_styling)
+        return self._excel_renderer
+
+    @property
+    def pdf_renderer(self):
+        if self._pdf_renderer is None:
+            from pdf_report import PdfReportRenderer
+            self._pdf_renderer = PdfReportRenderer()
+        return self._pdf_renderer
+
+    @property
+    def html_renderer(self):
+        if self._html_renderer is None:
+            from html_report import HtmlReportRenderer
+            self._html_renderer = HtmlReportRenderer()
+        return self._html_renderer
+
+    def parse(self, file_paths, fields=None, record_filter=None):
+        # fields projects the decode (see record_types.test_result_fields), the renderers need every field
+        # record_filter (sss_reader.RecordFilter) skips records before they are decoded
+        # .sssnap snapshots are loaded without decoding or deduplicating again, the filter is applied to their records
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        sss_file_paths = [file_path for file_path in file_paths if not is_snapshot(file_path)]
+        snapshot_file_paths = [file_path for file_path in file_paths if is_snapshot(file_path)]
+
+        machine_info = None
+        test_results = []
+        if len(sss_file_paths) > 0:
+            machine_info, test_results = parse_files(sss_file_paths, self.deduplicator, fields, record_filter)
+        for file_path in snapshot_file_paths:
+            for _, snapshot_machine_info, snapshot_test_results in self.parse_sources(file_path, None, record_filter,
+                                                                                      None):
+                if machine_info is None:
+                    machine_info = snapshot_machine_info
+                test_results.extend(snapshot_test_results)
+        return machine_info, test_results
+
+    def parse_sources(self, file_path, deduplicator, record_filter, strings):
+        # (source name, machine_info, test_results) of every .sss stream in file_path, or of the snapshot
+        if is_snapshot(file_path):
+            machine_info, test_results = parse_snapshot(file_path, record_filter)
+            yield file_path, machine_info, test_results
+            return
+
+        for source_name, source in open_sources(file_path):
+            with source as f:
+                machine_info, test_results = parse_stream(f, source_name, deduplicator, record_filter=record_filter,
+                                                          strings=strings)
+            yield source_name, machine_info, test_results
+
+    def write_snapshot(self, result_file_path, machine_info, test_results):
+        from snapshot import write_snapshot
+
+        file_path = f"{result_file_path}{snapshot_ext}"
+        write_snapshot(file_path, machine_info, test_results)
+        return file_path
+
+    def group(self, test_results):
+        return group_by_location(test_results)
+
+    def format(self, record_grouped_by_location, on_record=None, lazy=None):
+        # an HTML-only pipeline formats each record while it is written instead of keeping every formatted record
+        if lazy is None:
+            lazy = not self.excel and not self.pdf
+        if lazy:
+            return format_groups_lazily(record_grouped_by_location, on_record=on_record)
+        return format_groups(record_grouped_by_location, on_record=on_record)
+
+    def render_excel(self, result_file_path, machine_info, formatted_groups):
+        file_path = f"{result_file_path}.xlsx"
+        self.excel_renderer.render(file_path, machine_info, formatted_groups)
+        return file_path
+
+    def render_pdf(self, result_file_path, machine_info, formatted_groups):
+        file_path = f"{result_file_path}.pdf"
+        self.pdf_renderer.render(file_path, machine_info, formatted_groups)
+        return file_path
+
+    def render_html(self, result_file_path, machine_info, formatted_groups):
+        file_path = f"{result_file_path}.html"
+        self.html_renderer.render(file_path, machine_info, formatted_groups)
+        return file_path
+
+    def render(self, result_file_path, machine_info, formatted_groups):
+        written = []
+        if self.excel:
+            written.append(self.render_excel(result_file_path, machine_info, formatted_groups))
+        if self.pdf:
+            written.append(self.render_pdf(result_file_path, machine_info, formatted_groups))
+        if self.html:
+            written.append(self.render_html(result_file_path, machine_info, formatted_groups))
+        return written
+
+    def render_counting_failed(self, result_file_path, machine_info, test_results):
+        # formatted once up front, so counting the FAILED records does not format them again
+        formatted_groups = self.format(self.group(test_results), lazy=False)
+        file_paths = self.render(result_file_path, machine_info, formatted_groups)
+        failed = sum(1 for formatted_records in formatted_groups.values() for formatted in formatted_records
+                     if formatted.failed)
+        return file_paths, failed
+
+    def run(self, file_paths, output_dir='', result_file_path=None, record_filter=None):
+        machine_info, test_results = self.parse(file_paths, record_filter=record_filter)
+        formatted_groups = self.format(self.group(test_results))
+        if result_file_path is None:
+            first_file_path = file_paths if isinstance(file_paths, str) else file_paths[0]
+            result_file_path = get_result_file_path(first_file_path, output_dir)
+        return self.render(result_file_path, machine_info, formatted_groups)
+
+    def run_batch(self, file_paths, output_dir='', record_filter=None):
+        """
+        One report per .sss stream, archives are iterated member by member without being extracted.
+        .sssnap snapshots get one report each, loaded and filtered like in parse().
+        Returns {source name: written file paths}.
+        """
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        deduplicator = self.deduplicator if self.deduplicator is not None else RecordDeduplicator()
+        strings = StringDictionary()
+        used_result_file_paths = set()
+        written = {}
+
+        for file_path in file_paths:
+            for source_name, machine_info, test_results in self.parse_sources(file_path, deduplicator, record_filter,
+                                                                              strings):
+                result_file_path = get_result_file_path(source_name, output_dir)
+                if result_file_path in used_result_file_paths:
+                    result_file_path = f"{result_file_path}_{len(used_result_file_paths)}"
+                used_result_file_paths.add(result_file_path)
+                formatted_groups = self.format(self.group(test_results))
+                written[source_name] = self.render(result_file_path, machine_info, formatted_groups)
+        return written
+
+
+_worker_pipeline = None
+
+
+def init_worker(excel, pdf, html, excel_styling):
+    # ProcessPoolExecutor initializer, one pipeline per worker process reused for every report the worker renders
+    global _worker_pipeline
+    _worker_pipeline = ReportPipeline(excel=excel, pdf=pdf, html=html, excel_styling=excel_styling)
+
+
+def render_in_worker(result_file_path, machine_info, test_results):
+    # (written file paths, FAILED record count), in a process started with init_worker
+    return _worker_pipeline.render_counting_failed(result_file_path, machine_info, test_results)
@@ -1,4 +1,5 @@
 import struct
+import sys
 from abc import abstractmethod, ABC
 from datetime import datetime
 from typing import List
@@ -6,6 +7,31 @@ from typing import List
 from dateutil.relativedelta import relativedelta
 
 
+class StringDictionary:
+    """
+    Per-parse dictionary of fixed-width string fields, raw bytes -> decoded str.
+    Repeated values (site, location, operator, program, visual test names/units) are decoded once and then shared.
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.hits = 0
+        self.misses = 0
+        self.saved_bytes = 0
+
+    def decode(self, raw: bytes) -> str:
+        value = self.strings.get(raw)
+        if value is not None:
+            self.hits += 1
+            self.saved_bytes += sys.getsizeof(value)
+            return value
+
+        value = raw.replace(b'\x00', b'').decode('utf-8').rstrip()
+        self.misses += 1
+        self.strings[raw] = value
+        return value
+
+
 class BufferedRecord:
     def __init__(self, data: bytes):
         self.data = data
@@ -17,7 +43,9 @@ class BufferedRecord:
             self.idx += length
         return res
 
-    def read_str(self, length: int) -> str:
+    def read_str(self, length: int, strings: StringDictionary = None) -> str:
+        if strings is not None:
+            return strings.decode(self.read(length))
         return struct.unpack(f'{length}s', self.read(length))[0].replace(b'\x00', b'').decode('utf-8').rstrip()
 
     def read_float16(self):
@@ -48,6 +76,9 @@ class BufferedRecord:
     def skip(self, length: int):
         self.idx += length
 
+    def seek(self, idx: int):
+        self.idx = idx
+
     def __str__(self):
         filtered = {k: v for k, v in self.__dict__.items() if k not in ('data', 'idx')}
         return f"{self.__class__.__name__}({filtered})"
@@ -101,11 +132,11 @@ class TestResult(BufferedRecord):
 
 
 class VisualTestResult(TestResult):
-    def __init__(self, data: bytes):
+    def __init__(self, data: bytes, strings: StringDictionary = None):
         super().__init__(data)
 
-        self.name = self.read_str(16)
-        self.unit = self.read_str(16)
+        self.name = self.read_str(16, strings)
+        self.unit = self.read_str(16, strings)
         self.result = self.read_float16()
         self.flags = self.read_flag()
 
@@ -271,43 +302,106 @@ physical_test_type_class_defs = {
 }
 
 
+test_result_fields = (
+    'flags', 'asset_id', 'site_name', 'location_name', 'test_time', 'test_operator', 'comments',
+    'next_full_test_date', 'program', 'next_formal_visual_test_date', 'visual_test_results', 'physical_test_results'
+)
+
+
 class TestResult(BufferedRecord):
-    def __init__(self, data: bytes):
+    # fixed offsets of the header fields, the test blocks start after the first 0xfe following header_length
+    header_offsets = {
+        'flags': 0,
+        'asset_id': 1,
+        'site_name': 81,
+        'location_name': 97,
+        'test_time': 113,
+        'test_operator': 120,
+        'comments': 136,
+        'next_full_test_date': 265,
+        'program': 266,
+        'next_formal_visual_test_date': 296,
+    }
+    header_length = 312
+
+    def __init__(self, data: bytes, fields=None, strings: StringDictionary = None):
+        """
+        :param fields: names from test_result_fields to decode, None decodes everything.
+                       Only the requested attributes are set, get_status() needs 'flags'.
+        :param strings: StringDictionary shared by the whole parse, for the fields that repeat across records
+        """
         super().__init__(data)
-        self.flags = self.read_flag()
-        self.asset_id = self.read_str(16)
-        self.skip(64)
-        self.site_name = self.read_str(16)
-        self.location_name = self.read_str(16)
-        self.test_time = datetime(
-            hour=self.read_uint8(),
-            minute=self.read_uint8(),
-            second=self.read_uint8(),
-            day=self.read_uint8(),
-            month=self.read_uint8(),
-            year=self.read_uint16()
-        )
-        self.test_operator = self.read_str(16)
-        self.comments = self.read_str(128)
-        self.skip(1)
-        self.next_full_test_date = self.test_time + relativedelta(months=self.read_uint8())
-        self.program = self.read_str(30)
-        self.next_formal_visual_test_date = self.test_time + relativedelta(months=self.read_uint8())
-        self.skip(15)
-
+        if fields is None:
+            fields = test_result_fields
+
+        if 'flags' in fields:
+            self.seek(self.header_offsets['flags'])
+            self.flags = self.read_flag()
+        if 'asset_id' in fields:
+            self.seek(self.header_offsets['asset_id'])
+            self.asset_id = self.read_str(16)
+        if 'site_name' in fields:
+            self.seek(self.header_offsets['site_name'])
+            self.site_name = self.read_str(16, strings)
+        if 'location_name' in fields:
+            self.seek(self.header_offsets['location_name'])
+            self.location_name = self.read_str(16, strings)
+        if 'test_time' in fields or 'next_full_test_date' in fields or 'next_formal_visual_test_date' in fields:
+            self.seek(self.header_offsets['test_time'])
+            test_time = datetime(
+                hour=self.read_uint8(),
+                minute=self.read_uint8(),
+                second=self.read_uint8(),
+                day=self.read_uint8(),
+                month=self.read_uint8(),
+                year=self.read_uint16()
+            )
+            if 'test_time' in fields:
+                self.test_time = test_time
+            if 'next_full_test_date' in fields:
+                self.seek(self.header_offsets['next_full_test_date'])
+                self.next_full_test_date = test_time + relativedelta(months=self.read_uint8())
+            if 'next_formal_visual_test_date' in fields:
+                self.seek(self.header_offsets['next_formal_visual_test_date'])
+                self.next_formal_visual_test_date = test_time + relativedelta(months=self.read_uint8())
+        if 'test_operator' in fields:
+            self.seek(self.header_offsets['test_operator'])
+            self.test_operator = self.read_str(16, strings)
+        if 'comments' in fields:
+            self.seek(self.header_offsets['comments'])
+            self.comments = self.read_str(128)
+        if 'program' in fields:
+            self.seek(self.header_offsets['program'])
+            self.program = self.read_str(30, strings)
+
+        read_visual = 'visual_test_results' in fields
+        read_physical = 'physical_test_results' in fields
+        if read_visual:
+            self.visual_test_results: List[VisualTestResult] = []
+        if read_physical:
+            self.physical_test_results: List[PhysicalTestResult] = []
+        if not read_visual and not read_physical:
+            return
+
+        self.seek(self.header_length)
         while self.read(1)[0] != 0xfe:
             pass
 
-        self.visual_test_results: List[VisualTestResult] = []
-        self.physical_test_results: List[PhysicalTestResult] = []
-
+        # blocks nobody asked for are skipped by their length without being decoded
         while self.idx < len(self.data) - 2:
             test_type = self.read(1)[0]
             if test_type == 0xfd:
-                self.visual_test_results.append(VisualTestResult(self.read(35)))
+                if read_visual:
+                    self.visual_test_results.append(VisualTestResult(self.read(35), strings))
+                else:
+                    self.skip(35)
             elif test_type in physical_test_type_class_defs.keys():
-                self.physical_test_results.append(physical_test_type_class_defs[test_type](
-                    self.read(physical_test_type_class_defs[test_type].result_length)))
+                result_length = physical_test_type_class_defs[test_type].result_length
+                if read_physical:
+                    self.physical_test_results.append(physical_test_type_class_defs[test_type](
+                        self.read(result_length)))
+                else:
+                    self.skip(result_length)
             else:
                 print('Unknown test type:', self.read(30))
                 return
@@ -0,0 +1,146 @@
+from record_types import EarthResistanceTestResult, IECLeadContinuityTestResult, PointToPointTestResult, \
+    InsulationTestResult, SubstituteLeakageTestResult, PolarityTestResult, MainVoltageTestResult, \
+    TouchOrLeakageCurrentTestResult, RCDTestResult, StringComment
+
+
+def replace_sub(text):
+    if text == '':
+        return 'N/A'
+    else:
+        return text
+
+
+class FormattedRecord:
+    """
+    One test record laid out as [test type, result, unit, status] rows, shared by the report writers.
+    merge_rows/failed_rows/plain_rows hold row offsets relative to the first row of the record, plain_rows are never
+    highlighted whatever their status.
+    """
+
+    def __init__(self, record):
+        self.record = record
+        self.rows = []
+        self.merge_rows = []
+        self.failed_rows = []
+        self.plain_rows = []
+
+    def add_row(self, name, result, unit, status, merge=False, highlight=True):
+        if merge:
+            self.merge_rows.append(len(self.rows))
+        if not highlight:
+            self.plain_rows.append(len(self.rows))
+        elif status == 'FAIL':
+            self.failed_rows.append(len(self.rows))
+        self.rows.append([
+            replace_sub(str(name)),
+            replace_sub(str(result)),
+            replace_sub(str(unit).lower()),
+            replace_sub(str(status))
+        ])
+
+    @property
+    def failed(self):
+        return len(self.failed_rows) > 0
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def format_record(record):
+    formatted = FormattedRecord(record)
+
+    for visual_test_result in record.visual_test_results:
+        formatted.add_row(
+            visual_test_result.name,
+            visual_test_result.result if visual_test_result.unit else "",
+            visual_test_result.unit,
+            visual_test_result.flags[0],
+            merge=not visual_test_result.unit
+        )
+
+    for physical_test_result in record.physical_test_results:
+        if isinstance(physical_test_result, EarthResistanceTestResult):
+            formatted.add_row("Earth Continuity", physical_test_result.get_value(),
+                              physical_test_result.resistance.unit, physical_test_result.get_status())
+        elif isinstance(physical_test_result, IECLeadContinuityTestResult):
+            formatted.add_row("IEC Lead Continuity", physical_test_result.get_value(),
+                              physical_test_result.resistance.unit, physical_test_result.get_status())
+        elif isinstance(physical_test_result, PointToPointTestResult):
+            formatted.add_row("Point To Point Resistance", physical_test_result.get_value(),
+                              physical_test_result.resistance.unit, physical_test_result.get_status())
+        elif isinstance(physical_test_result, InsulationTestResult):
+            formatted.add_row("Insulation", physical_test_result.get_value(),
+                              physical_test_result.resistance.unit, physical_test_result.get_status())
+            formatted.add_row("Insulation Voltage", physical_test_result.voltage.value,
+                              physical_test_result.voltage.unit, "INFO")
+        elif isinstance(physical_test_result, SubstituteLeakageTestResult):
+            formatted.add_row("Substitute Leakage Current", physical_test_result.get_value(),
+                              physical_test_result.current.unit, physical_test_result.get_status())
+        elif isinstance(physical_test_result, PolarityTestResult):
+            formatted.add_row("IEC Lead Polarity", physical_test_result.get_value(), "",
+                              physical_test_result.get_status(), merge=True)
+        elif isinstance(physical_test_result, MainVoltageTestResult):
+            formatted.add_row("Main Voltage", physical_test_result.get_value(),
+                              physical_test_result.voltage.unit, physical_test_result.get_status())
+        elif isinstance(physical_test_result, TouchOrLeakageCurrentTestResult):
+            formatted.add_row("Touch Or Leakage Test Load Current", physical_test_result.load_current.value,
+                              physical_test_result.load_current.unit, physical_test_result.get_status())
+            formatted.add_row("Touch Or Leakage Test Leakage Current", physical_test_result.leakage_current.value,
+                              physical_test_result.leakage_current.unit, physical_test_result.get_status())
+        elif isinstance(physical_test_result, RCDTestResult):
+            formatted.add_row("RCD Test Current", physical_test_result.test_current.value,
+                              physical_test_result.test_current.unit, "INFO")
+            formatted.add_row("RCD Test Circle Angle", physical_test_result.circle_angle.value,
+                              physical_test_result.circle_angle.unit, "INFO")
+            formatted.add_row("RCD Test Trip time", physical_test_result.get_value(),
+                              physical_test_result.trip_time.unit, physical_test_result.get_status())
+        elif isinstance(physical_test_result, StringComment):
+            formatted.add_row(physical_test_result.string_value, "", "", physical_test_result.get_status(),
+                              merge=True, highlight=False)
+
+    return formatted
+
+
+def group_by_location(test_results):
+    # show records in different site/location seperately
+    record_grouped_by_location = {}
+    for record in test_results:
+        location = f"{record.site_name} - {record.location_name}"
+        record_grouped_by_location.setdefault(location, []).append(record)
+    return record_grouped_by_location
+
+
+def format_groups(record_grouped_by_location, on_record=None):
+    formatted_groups = {}
+    for location, records in record_grouped_by_location.items():
+        formatted_groups[location] = []
+        for record in records:
+            formatted_groups[location].append(format_record(record))
+            if on_record is not None:
+                on_record(record)
+    return formatted_groups
+
+
+class LazyFormattedRecords:
+    """
+    Formats the records of one location only while being iterated, so a streaming renderer never holds more than one
+    FormattedRecord at a time.
+    """
+
+    def __init__(self, records, on_record=None):
+        self.records = records
+        self.on_record = on_record
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        for record in self.records:
+            yield format_record(record)
+            if self.on_record is not None:
+                self.on_record(record)
+
+
+def format_groups_lazily(record_grouped_by_location, on_record=None):
+    return {location: LazyFormattedRecords(records, on_record)
+            for location, records in record_grouped_by_location.items()}
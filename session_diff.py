@@ -0,0 +1,170 @@
+import logging
+from datetime import datetime, timedelta
+
+from pipeline import ReportPipeline
+from record_types import EarthResistanceTestResult, InsulationTestResult
+
+logger = logging.getLogger()
+
+# everything the diff reads, visual tests, operator, comments and program are not decoded
+diff_fields = ('flags', 'asset_id', 'site_name', 'location_name', 'test_time', 'next_full_test_date',
+               'next_formal_visual_test_date', 'physical_test_results')
+
+# measurement name -> (test class, attribute, default drift threshold in the measurement unit)
+drift_measurements = {
+    'Earth Resistance (ohm)': (EarthResistanceTestResult, 'resistance', 0.1),
+    'Insulation Resistance (mohm)': (InsulationTestResult, 'resistance', 5.0),
+}
+
+
+def latest_by_asset(test_results):
+    # one hash table per session, an asset tested more than once is represented by its latest test
+    latest = {}
+    for record in test_results:
+        current = latest.get(record.asset_id)
+        if current is None or record.test_time > current.test_time:
+            latest[record.asset_id] = record
+    return latest
+
+
+def measurement(record, cls, attr):
+    for physical_test_result in record.physical_test_results:
+        if type(physical_test_result) is cls:
+            return getattr(physical_test_result, attr).value
+    return None
+
+
+class SessionDiff:
+    """
+    Delta between two sessions, hash-joined on asset_id, so diffing is linear in the number of records.
+    Each list holds (old record, new record) pairs, None for the side the asset is missing from.
+    """
+
+    def __init__(self, old_name, new_name, old_assets, new_assets, thresholds=None):
+        self.old_name = old_name
+        self.new_name = new_name
+        thresholds = {} if thresholds is None else thresholds
+        self.new = []
+        self.status_changes = []
+        # (measurement name, old record, new record, old value, new value)
+        self.drifts = []
+
+        for asset_id, new_record in new_assets.items():
+            old_record = old_assets.get(asset_id)
+            if old_record is None:
+                self.new.append((None, new_record))
+                continue
+
+            if old_record.get_status() != new_record.get_status():
+                self.status_changes.append((old_record, new_record))
+            for name, (cls, attr, default_threshold) in drift_measurements.items():
+                old_value = measurement(old_record, cls, attr)
+                new_value = measurement(new_record, cls, attr)
+                if old_value is None or new_value is None:
+                    continue
+                if abs(new_value - old_value) > thresholds.get(name, default_threshold):
+                    self.drifts.append((name, old_record, new_record, old_value, new_value))
+
+        self.missing = [(old_record, None) for asset_id, old_record in old_assets.items()
+                        if asset_id not in new_assets]
+
+    @property
+    def newly_failed(self):
+        return [(old_record, new_record) for old_record, new_record in self.status_changes
+                if old_record.get_status() == 'PASS' and new_record.get_status() == 'FAIL']
+
+
+def retest_due(assets, start, end):
+    # (due tests, record) of the assets whose next full or formal visual test falls within [start, end]
+    due = []
+    for record in assets.values():
+        kinds = []
+        if start <= record.next_full_test_date <= end:
+            kinds.append('Full')
+        if start <= record.next_formal_visual_test_date <= end:
+            kinds.append('Formal Visual')
+        if len(kinds) > 0:
+            due.append((', '.join(kinds), record))
+    return due
+
+
+def diff_files(file_paths, thresholds=None, record_filter=None):
+    """
+    Parses every file as its own session and diffs each session against the one before it, in the given order.
+    Returns the diffs and the latest test of every asset over all the sessions.
+    """
+    assert len(file_paths) >= 2, 'At least two sessions are needed for a diff'
+
+    diffs = []
+    fleet = {}
+    previous_name, previous_assets = None, None
+    for file_path in file_paths:
+        machine_info, test_results = ReportPipeline().parse(file_path, fields=diff_fields,
+                                                            record_filter=record_filter)
+        assets = latest_by_asset(test_results)
+        if previous_assets is not None:
+            diffs.append(SessionDiff(previous_name, file_path, previous_assets, assets, thresholds))
+        for asset_id, record in assets.items():
+            if asset_id not in fleet or record.test_time > fleet[asset_id].test_time:
+                fleet[asset_id] = record
+        previous_name, previous_assets = file_path, assets
+    return diffs, fleet
+
+
+record_headers = ["Asset ID", "Site", "Location", "Test Date", "Status"]
+
+
+def record_cells(record):
+    if record is None:
+        return ["", "", "", "", ""]
+    return [record.asset_id, record.site_name, record.location_name, record.test_time, record.get_status()]
+
+
+def write_diff_report(file_path, diffs, fleet, due_start=None, due_end=None):
+    from openpyxl import Workbook
+
+    due_start = datetime.now() if due_start is None else due_start
+    due_end = due_start + timedelta(days=30) if due_end is None else due_end
+
+    # write-only, rows are streamed to the file so large fleets stay linear in time and flat in memory
+    wb = Workbook(write_only=True)
+    due = retest_due(fleet, due_start, due_end)
+    ws = wb.create_sheet('Summary')
+    ws.append(["Old Session", "New Session", "New", "Missing", "Status Changes", "PASS -> FAIL", "Drifts"])
+    for diff in diffs:
+        ws.append([diff.old_name, diff.new_name, len(diff.new), len(diff.missing), len(diff.status_changes),
+                   len(diff.newly_failed), len(diff.drifts)])
+    ws.append([])
+    ws.append([f"Retest due from {due_start.strftime('%d/%m/%Y')} to {due_end.strftime('%d/%m/%Y')}", len(due)])
+
+    ws = wb.create_sheet('New')
+    ws.append(["New Session"] + record_headers)
+    for diff in diffs:
+        for old_record, new_record in diff.new:
+            ws.append([diff.new_name] + record_cells(new_record))
+
+    ws = wb.create_sheet('Missing')
+    ws.append(["New Session"] + record_headers)
+    for diff in diffs:
+        for old_record, new_record in diff.missing:
+            ws.append([diff.new_name] + record_cells(old_record))
+
+    ws = wb.create_sheet('Status Changes')
+    ws.append(["New Session"] + record_headers + ["Old Test Date", "Old Status"])
+    for diff in diffs:
+        for old_record, new_record in diff.status_changes:
+            ws.append([diff.new_name] + record_cells(new_record) + [old_record.test_time, old_record.get_status()])
+
+    ws = wb.create_sheet('Drift')
+    ws.append(["New Session"] + record_headers + ["Measurement", "Old Value", "New Value", "Change"])
+    for diff in diffs:
+        for name, old_record, new_record, old_value, new_value in diff.drifts:
+            ws.append([diff.new_name] + record_cells(new_record) +
+                      [name, old_value, new_value, round(new_value - old_value, 2)])
+
+    ws = wb.create_sheet('Retest Due')
+    ws.append(record_headers + ["Due", "Next Full Test", "Next Formal Visual Test"])
+    for kinds, record in due:
+        ws.append(record_cells(record) + [kinds, record.next_full_test_date, record.next_formal_visual_test_date])
+
+    wb.save(file_path)
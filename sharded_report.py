@@ -0,0 +1,92 @@
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipeline import ReportPipeline, init_worker, render_in_worker
+
+logger = logging.getLogger()
+
+shard_keys = {
+    'site': lambda record: record.site_name,
+    'location': lambda record: f"{record.site_name} - {record.location_name}",
+}
+
+
+class Shard:
+    def __init__(self, name, records):
+        self.name = name
+        self.records = records
+        self.failed = 0
+        self.file_paths = []
+
+
+def split_shards(test_results, shard_by=None, shard_size=None):
+    # records are kept in location order so a size limited shard splits as few locations as possible
+    records_by_key = {}
+    for records in ReportPipeline().group(test_results).values():
+        for record in records:
+            key = shard_keys[shard_by](record) if shard_by is not None else 'all'
+            records_by_key.setdefault(key, []).append(record)
+
+    shards = []
+    for key, records in records_by_key.items():
+        if shard_size is None or len(records) <= shard_size:
+            shards.append(Shard(key, records))
+            continue
+        for part, start in enumerate(range(0, len(records), shard_size), start=1):
+            shards.append(Shard(f"{key} part {part}", records[start:start + shard_size]))
+    return shards
+
+
+def get_shard_file_path(result_file_path, shard_name, used_shard_file_paths):
+    # different names can clean up to the same file name ("Site A" / "Site-A", non-ASCII names), number those
+    base_file_path = f"{result_file_path}_{re.sub(r'[^A-Za-z0-9]+', '_', shard_name).strip('_') or 'shard'}"
+    shard_file_path = base_file_path
+    number = 1
+    while shard_file_path.lower() in used_shard_file_paths:
+        number += 1
+        shard_file_path = f"{base_file_path}_{number}"
+    used_shard_file_paths.add(shard_file_path.lower())
+    return shard_file_path
+
+
+def write_index(file_path, shards):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Shards'
+    ws.append(["Shard", "Records", "Failed", "Files"])
+    for shard in shards:
+        ws.append([shard.name, len(shard.records), shard.failed,
+                   ', '.join(os.path.basename(path) for path in shard.file_paths)])
+    ws.append(["Total", sum(len(shard.records) for shard in shards), sum(shard.failed for shard in shards), ""])
+
+    for col_letter, width in zip('ABCD', [40, 10, 10, 80]):
+        ws.column_dimensions[col_letter].width = width
+    wb.save(file_path)
+
+
+def render_shards(result_file_path, machine_info, test_results, shard_by=None, shard_size=None, excel=True,
+                  pdf=True, html=False, workers=None, excel_styling='cells'):
+    assert shard_size is None or shard_size >= 1, 'The shard size must be at least 1'
+    shards = split_shards(test_results, shard_by=shard_by, shard_size=shard_size)
+    logger.info(f"Rendering {len(shards)} shards")
+    used_shard_file_paths = set()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(excel, pdf, html, excel_styling)) as executor:
+        futures = {
+            executor.submit(render_in_worker, get_shard_file_path(result_file_path, shard.name, used_shard_file_paths),
+                            machine_info, shard.records): shard
+            for shard in shards
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            shard.file_paths, shard.failed = future.result()
+            logger.info(f"Shard {shard.name} written, {len(shard.records)} records, {shard.failed} FAILED")
+
+    index_file_path = f"{result_file_path}_index.xlsx"
+    write_index(index_file_path, shards)
+    return index_file_path, shards
@@ -0,0 +1,256 @@
+"""
+Compact, versioned snapshot of a parsed session (.sssnap), little-endian throughout:
+
+    file header    magic, version, record count, test count, string count
+    string table   u32 offsets (string count + 1) + utf-8 blob, every string column is an index into it
+    machine info   model and serial number string indexes
+    record columns flag byte, asset_id, site_name, location_name, test_operator, comments, program (string indexes),
+                   test_time, next_full_test_date, next_formal_visual_test_date (i64 seconds since 1970-01-01),
+                   u32 offsets (record count + 1) into the test columns
+    test columns   test type byte, flag byte, two string indexes (visual name/unit, comment text) and three f64
+                   values, see test_value_attrs for which value is which
+
+Every column is written in one go and padded to 8 bytes, so loading maps the file and casts the columns in place.
+"""
+import mmap
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+from record_types import BufferedRecord, MachineInfo, TestResult, ValueWithUnit, VisualTestResult, \
+    test_result_fields, EarthResistanceTestResult, IECLeadContinuityTestResult, PointToPointTestResult, \
+    InsulationTestResult, SubstituteLeakageTestResult, PolarityTestResult, MainVoltageTestResult, \
+    TouchOrLeakageCurrentTestResult, RCDTestResult, StringComment, physical_test_type_class_defs
+
+
+snapshot_magic = b'SSSNAP\x00\x00'
+snapshot_version = 1
+snapshot_header = struct.Struct('<8sHIII')
+
+epoch = datetime(1970, 1, 1)
+visual_test_type = 0xfd
+string_columns = ('asset_id', 'site_name', 'location_name', 'test_operator', 'comments', 'program')
+time_columns = ('test_time', 'next_full_test_date', 'next_formal_visual_test_date')
+
+# TestResult.flags of every possible flag byte, and back
+flags_of_byte = [BufferedRecord(bytes([byte_val])).read_flag() for byte_val in range(256)]
+byte_of_flags = {tuple(flags): byte_val for byte_val, flags in reversed(list(enumerate(flags_of_byte)))}
+physical_test_type_codes = {cls: test_type for test_type, cls in physical_test_type_class_defs.items()}
+
+# (attribute, unit) of the ValueWithUnit measurements stored in the value columns, in column order
+test_value_attrs = {
+    EarthResistanceTestResult: (('resistance', 'ohm'),),
+    IECLeadContinuityTestResult: (('resistance', 'ohm'),),
+    PointToPointTestResult: (('resistance', 'ohm'),),
+    InsulationTestResult: (('voltage', 'v'), ('resistance', 'mohm')),
+    SubstituteLeakageTestResult: (('current', 'ma'),),
+    PolarityTestResult: (),
+    MainVoltageTestResult: (('voltage', 'v'),),
+    TouchOrLeakageCurrentTestResult: (('load_current', 'ma'), ('leakage_current', 'ma')),
+    RCDTestResult: (('test_current', 'ma'), ('circle_angle', 'deg'), ('trip_time', 'ms')),
+    StringComment: (),
+}
+
+
+def to_seconds(value):
+    return (value - epoch) // timedelta(seconds=1)
+
+
+def pad(length):
+    return -length % 8
+
+
+class SnapshotWriter:
+    def __init__(self, f):
+        self.f = f
+        self.strings = {}
+
+    def string_idx(self, value):
+        idx = self.strings.get(value)
+        if idx is None:
+            idx = self.strings[value] = len(self.strings)
+        return idx
+
+    def write_bytes(self, data):
+        self.f.write(data)
+        self.f.write(b'\x00' * pad(len(data)))
+
+    def write_column(self, typecode, values):
+        column = array(typecode, values)
+        if sys.byteorder == 'big':
+            column.byteswap()
+        self.write_bytes(column.tobytes())
+
+
+def write_snapshot(file_path, machine_info, test_results):
+    # a snapshot stands in for the whole session, so it can only be written from fully decoded records
+    for record in test_results:
+        missing = [name for name in test_result_fields if not hasattr(record, name)]
+        if len(missing) > 0:
+            raise ValueError(f"Record {getattr(record, 'asset_id', '?')} was parsed without {', '.join(missing)}, "
+                             f"a snapshot needs every field (parse without fields=...)")
+
+    columns = {name: [] for name in string_columns}
+    times = {name: [] for name in time_columns}
+    flag_bytes = []
+    test_offsets = [0]
+    test_types = []
+    test_flag_bytes = []
+    test_strings = ([], [])
+    test_values = ([], [], [])
+
+    with open(file_path, 'wb') as f:
+        writer = SnapshotWriter(f)
+        machine_columns = [writer.string_idx(machine_info.machine_model),
+                           writer.string_idx(machine_info.machine_serial_number)]
+
+        for record in test_results:
+            flag_bytes.append(byte_of_flags[tuple(record.flags)])
+            for name in string_columns:
+                columns[name].append(writer.string_idx(getattr(record, name)))
+            for name in time_columns:
+                times[name].append(to_seconds(getattr(record, name)))
+
+            for test in record.visual_test_results:
+                test_types.append(visual_test_type)
+                test_flag_bytes.append(byte_of_flags[tuple(test.flags)])
+                test_strings[0].append(writer.string_idx(test.name))
+                test_strings[1].append(writer.string_idx(test.unit))
+                values = [test.result]
+                for i in range(3):
+                    test_values[i].append(values[i] if i < len(values) else 0)
+            for test in record.physical_test_results:
+                test_types.append(physical_test_type_codes[type(test)])
+                test_flag_bytes.append(byte_of_flags[tuple(test.flags)])
+                test_strings[0].append(writer.string_idx(test.string_value) if type(test) is StringComment else 0)
+                test_strings[1].append(0)
+                values = [getattr(test, attr).value for attr, unit in test_value_attrs[type(test)]]
+                for i in range(3):
+                    test_values[i].append(values[i] if i < len(values) else 0)
+            test_offsets.append(len(test_types))
+
+        encoded_strings = [value.encode('utf-8') for value in writer.strings]
+        string_offsets = [0]
+        for encoded in encoded_strings:
+            string_offsets.append(string_offsets[-1] + len(encoded))
+
+        writer.write_bytes(snapshot_header.pack(snapshot_magic, snapshot_version, len(test_results), len(test_types),
+                                                len(encoded_strings)))
+        writer.write_column('I', string_offsets)
+        writer.write_bytes(b''.join(encoded_strings))
+        writer.write_column('I', machine_columns)
+        writer.write_column('B', flag_bytes)
+        for name in string_columns:
+            writer.write_column('I', columns[name])
+        for name in time_columns:
+            writer.write_column('q', times[name])
+        writer.write_column('I', test_offsets)
+        writer.write_column('B', test_types)
+        writer.write_column('B', test_flag_bytes)
+        for column in test_strings:
+            writer.write_column('I', column)
+        for column in test_values:
+            writer.write_column('d', column)
+
+
+class SnapshotReader:
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        self.idx = 0
+
+    def read_bytes(self, length):
+        res = self.buffer[self.idx: self.idx + length]
+        self.idx += length + pad(length)
+        return res
+
+    def read_column(self, typecode, count):
+        size = array(typecode).itemsize * count
+        raw = self.read_bytes(size)
+        if sys.byteorder == 'big':
+            column = array(typecode, raw.tobytes())
+            column.byteswap()
+            return column
+        return raw.cast(typecode)
+
+
+def load_snapshot(file_path):
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            reader = SnapshotReader(mm)
+            try:
+                return read_snapshot(reader)
+            finally:
+                # the mmap can only close once no view of it is left
+                reader.buffer.release()
+
+
+def read_snapshot(reader):
+    magic, version, record_count, test_count, string_count = snapshot_header.unpack(
+        reader.read_bytes(snapshot_header.size))
+    assert magic == snapshot_magic, 'Not a snapshot file'
+    assert version == snapshot_version, f'Unsupported snapshot version {version}'
+
+    string_offsets = reader.read_column('I', string_count + 1)
+    string_blob = reader.read_bytes(string_offsets[-1])
+    strings = [str(string_blob[string_offsets[i]: string_offsets[i + 1]], 'utf-8') for i in range(string_count)]
+    string_blob.release()
+
+    machine_columns = reader.read_column('I', 2)
+    machine_info = MachineInfo.__new__(MachineInfo)
+    machine_info.data = b''
+    machine_info.idx = 0
+    machine_info.machine_model = strings[machine_columns[0]]
+    machine_info.machine_serial_number = strings[machine_columns[1]]
+
+    flag_bytes = reader.read_column('B', record_count)
+    columns = {name: reader.read_column('I', record_count) for name in string_columns}
+    times = {name: reader.read_column('q', record_count) for name in time_columns}
+    test_offsets = reader.read_column('I', record_count + 1)
+    test_types = reader.read_column('B', test_count)
+    test_flag_bytes = reader.read_column('B', test_count)
+    test_strings = [reader.read_column('I', test_count) for _ in range(2)]
+    test_values = [reader.read_column('d', test_count) for _ in range(3)]
+
+    test_results = []
+    for i in range(record_count):
+        record = new_record(TestResult, flags_of_byte[flag_bytes[i]])
+        for name in string_columns:
+            setattr(record, name, strings[columns[name][i]])
+        for name in time_columns:
+            setattr(record, name, epoch + timedelta(seconds=times[name][i]))
+
+        record.visual_test_results = []
+        record.physical_test_results = []
+        for j in range(test_offsets[i], test_offsets[i + 1]):
+            if test_types[j] == visual_test_type:
+                test = new_record(VisualTestResult, flags_of_byte[test_flag_bytes[j]])
+                test.name = strings[test_strings[0][j]]
+                test.unit = strings[test_strings[1][j]]
+                test.result = test_values[0][j]
+                record.visual_test_results.append(test)
+                continue
+
+            cls = physical_test_type_class_defs[test_types[j]]
+            test = new_record(cls, flags_of_byte[test_flag_bytes[j]])
+            for k, (attr, unit) in enumerate(test_value_attrs[cls]):
+                setattr(test, attr, ValueWithUnit(test_values[k][j], unit))
+            if cls is StringComment:
+                test.string_value = strings[test_strings[0][j]]
+            record.physical_test_results.append(test)
+        test_results.append(record)
+
+    for column in [string_offsets, machine_columns, flag_bytes, test_offsets, test_types, test_flag_bytes] + \
+            test_strings + test_values + list(columns.values()) + list(times.values()):
+        if isinstance(column, memoryview):
+            column.release()
+    return machine_info, test_results
+
+
+def new_record(cls, flags):
+    # the snapshot already holds the decoded values, so the record is built without going through __init__
+    record = cls.__new__(cls)
+    record.data = b''
+    record.idx = 0
+    record.flags = flags
+    return record
@@ -0,0 +1,237 @@
+import bz2
+import gzip
+import logging
+import lzma
+import os
+import struct
+import zipfile
+from datetime import datetime
+
+from record_types import BufferedRecord, MachineInfo, StringDictionary, TestResult, record_type_class_defs
+
+logger = logging.getLogger()
+
+
+def read_records(f):
+    while True:
+        start_byte = f.read(1)
+        assert start_byte == b'\x55'
+
+        record_length = f.read(2)
+        length_val = struct.unpack('<H', record_length)[0]
+        logger.debug(f'Found record, length = {length_val}')
+
+        checksum = f.read(2)
+        checksum_val = struct.unpack('<H', checksum)[0]
+
+        empty_byte = f.read(2)
+        assert empty_byte == b'\x00\x00'
+
+        # I don't know why but sometimes the length will short a little bit
+        record_content = f.read(length_val)
+        calculated_checksum = (sum(record_content)) & 0xffff
+        if calculated_checksum == checksum_val or calculated_checksum == checksum_val + 1:
+            logger.debug(f'Record checksum passed')
+        else:
+            length_val += 1
+            record_content += f.read(1)
+            calculated_checksum = (sum(record_content)) & 0xffff
+            assert calculated_checksum == checksum_val or calculated_checksum == checksum_val + 1
+            logger.debug(f'Record checksum passed')
+
+        if record_content[0] == 0xaa and record_content[1] == 0xff:
+            return
+
+        yield checksum_val, record_content
+
+
+def header_slice(field, length):
+    # +1 for the record type byte in front of the TestResult data
+    start = 1 + TestResult.header_offsets[field]
+    return slice(start, start + length)
+
+
+flags_idx = 1 + TestResult.header_offsets['flags']
+asset_id_slice = header_slice('asset_id', 16)
+site_name_slice = header_slice('site_name', 16)
+location_name_slice = header_slice('location_name', 16)
+test_time_slice = header_slice('test_time', 7)
+
+# TestResult.get_status() of every possible flag byte
+status_of_flag_byte = [BufferedRecord(bytes([byte_val])).read_flag()[0] for byte_val in range(256)]
+
+
+def raw_str(field_bytes):
+    # same as BufferedRecord.read_str, without the decode
+    return field_bytes.replace(b'\x00', b'').rstrip()
+
+
+def time_key(value, end=False):
+    if not isinstance(value, datetime):
+        # a bare date covers the whole day, from its first to its last second
+        return (value.year, value.month, value.day) + ((23, 59, 59) if end else (0, 0, 0))
+    return value.year, value.month, value.day, value.hour, value.minute, value.second
+
+
+class RecordFilter:
+    """
+    Predicates on status, site_name, location_name and test_time, evaluated against the fixed offset header bytes of a
+    framed test record, so records that do not match are skipped before any string decoding or object construction.
+    matches_record() evaluates the same predicates on an already decoded TestResult, e.g. one loaded from a snapshot.
+    Every given predicate must match, start_time/end_time are both inclusive and can be datetimes or whole days (dates).
+    """
+
+    def __init__(self, statuses=None, site_names=None, location_names=None, start_time=None, end_time=None):
+        self.statuses = set(statuses) if statuses is not None else None
+        self.site_names = {name.encode('utf-8') for name in site_names} if site_names is not None else None
+        self.location_names = {name.encode('utf-8') for name in location_names} \
+            if location_names is not None else None
+        self.start_key = time_key(start_time) if start_time is not None else None
+        self.end_key = time_key(end_time, end=True) if end_time is not None else None
+        self.skipped = 0
+
+    def matches(self, record_content):
+        if self.statuses is not None and status_of_flag_byte[record_content[flags_idx]] not in self.statuses:
+            return self.skip()
+        if self.site_names is not None and raw_str(record_content[site_name_slice]) not in self.site_names:
+            return self.skip()
+        if self.location_names is not None and \
+                raw_str(record_content[location_name_slice]) not in self.location_names:
+            return self.skip()
+        if self.start_key is not None or self.end_key is not None:
+            hour, minute, second, day, month, year = struct.unpack('<5BH', record_content[test_time_slice])
+            key = (year, month, day, hour, minute, second)
+            if self.start_key is not None and key < self.start_key:
+                return self.skip()
+            if self.end_key is not None and key > self.end_key:
+                return self.skip()
+        return True
+
+    def matches_record(self, record):
+        if self.statuses is not None and record.get_status() not in self.statuses:
+            return self.skip()
+        if self.site_names is not None and record.site_name.encode('utf-8') not in self.site_names:
+            return self.skip()
+        if self.location_names is not None and record.location_name.encode('utf-8') not in self.location_names:
+            return self.skip()
+        key = time_key(record.test_time)
+        if self.start_key is not None and key < self.start_key:
+            return self.skip()
+        if self.end_key is not None and key > self.end_key:
+            return self.skip()
+        return True
+
+    def skip(self):
+        self.skipped += 1
+        return False
+
+
+class RecordDeduplicator:
+    """
+    Drops test records already seen, keyed on (machine serial, asset_id, test_time, record checksum).
+    The key is taken from the raw header bytes, so a duplicate is skipped before it is decoded.
+    Share one instance between files to also drop records repeated across exports.
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.dropped = 0
+
+    def is_duplicate(self, machine_serial, checksum, record_content):
+        key = (machine_serial, record_content[asset_id_slice], record_content[test_time_slice], checksum)
+        if key in self.seen:
+            self.dropped += 1
+            return True
+        self.seen.add(key)
+        return False
+
+
+compression_openers = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open,
+}
+
+
+def open_sources(file_path):
+    """
+    Yields (source name, readable binary stream) for every .sss stream in file_path, each stream should be read and
+    closed before asking for the next one.
+    .gz/.bz2/.xz files are decompressed on the fly and .zip files yield each .sss member, nothing is extracted to disk.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in compression_openers:
+        yield os.path.splitext(file_path)[0], compression_openers[ext](file_path, 'rb')
+    elif ext == '.zip':
+        with zipfile.ZipFile(file_path) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and member.filename.lower().endswith('.sss'):
+                    yield f"{file_path}:{member.filename}", archive.open(member)
+    else:
+        yield file_path, open(file_path, 'rb')
+
+
+def parse_stream(f, source_name, deduplicator, fields=None, record_filter=None, strings=None):
+    dropped_before = deduplicator.dropped
+    skipped_before = record_filter.skipped if record_filter is not None else 0
+    test_results = []
+    machine_info = None
+
+    for checksum, record_content in read_records(f):
+        if record_content[0] == 0x01:
+            if record_filter is not None and not record_filter.matches(record_content):
+                continue
+            machine_serial = machine_info.machine_serial_number if machine_info is not None else ''
+            if deduplicator.is_duplicate(machine_serial, checksum, record_content):
+                logger.debug(f'Duplicate record dropped')
+                continue
+            instance = TestResult(record_content[1:], fields, strings)
+        else:
+            instance = record_type_class_defs[record_content[0]](record_content[1:])
+
+        if type(instance) is MachineInfo:
+            machine_info = instance
+        else:
+            test_results.append(instance)
+        logger.debug(f'Record content = {instance}')
+
+    logger.info(f"Parsed {len(test_results)} record from {source_name}, "
+                f"dropped {deduplicator.dropped - dropped_before} duplicate")
+    if record_filter is not None:
+        logger.info(f"Skipped {record_filter.skipped - skipped_before} record not matching the filter")
+    return machine_info, test_results
+
+
+def log_string_metrics(strings):
+    logger.info(f"String dictionary: {len(strings.strings)} distinct, {strings.hits} hits / {strings.misses} decoded, "
+                f"~{strings.saved_bytes / 1024:.1f} KiB of duplicate strings not allocated")
+
+
+def parse_files(file_paths, deduplicator=None, fields=None, record_filter=None, strings=None):
+    if deduplicator is None:
+        deduplicator = RecordDeduplicator()
+    if strings is None:
+        strings = StringDictionary()
+    test_results = []
+    machine_info = None
+    source_count = 0
+
+    for file_path in file_paths:
+        for source_name, source in open_sources(file_path):
+            with source as f:
+                source_machine_info, source_test_results = parse_stream(f, source_name, deduplicator, fields,
+                                                                        record_filter, strings)
+            source_count += 1
+            if machine_info is None:
+                machine_info = source_machine_info
+            elif source_machine_info.machine_serial_number != machine_info.machine_serial_number:
+                logger.warning(f"{source_name} comes from tester {source_machine_info.machine_serial_number}, "
+                               f"the report only shows {machine_info.machine_serial_number}")
+            test_results.extend(source_test_results)
+
+    if source_count > 1:
+        logger.info(f"Parsed {len(test_results)} record from {source_count} files, "
+                    f"dropped {deduplicator.dropped} duplicate in total")
+    log_string_metrics(strings)
+    return machine_info, test_results
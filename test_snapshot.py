@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from record_types import ValueWithUnit
+from snapshot import load_snapshot, write_snapshot
+from sss_reader import parse_files
+
+example_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TestResults.sss')
+
+
+def decoded_fields(instance):
+    # every decoded attribute, the raw buffer and its read position are not part of the snapshot
+    fields = {'type': type(instance).__name__}
+    for name, value in vars(instance).items():
+        if name in ('data', 'idx'):
+            continue
+        if isinstance(value, ValueWithUnit):
+            value = (value.value, value.unit)
+        elif name.endswith('_test_results'):
+            value = [decoded_fields(test) for test in value]
+        fields[name] = value
+    return fields
+
+
+def test_snapshot_round_trip(tmp_path):
+    machine_info, test_results = parse_files([example_file_path])
+    file_path = str(tmp_path / 'session.sssnap')
+    write_snapshot(file_path, machine_info, test_results)
+    loaded_machine_info, loaded_test_results = load_snapshot(file_path)
+
+    assert decoded_fields(loaded_machine_info) == decoded_fields(machine_info)
+    assert len(loaded_test_results) == len(test_results)
+    for loaded, record in zip(loaded_test_results, test_results):
+        assert decoded_fields(loaded) == decoded_fields(record)
+
+
+def test_snapshot_needs_every_field(tmp_path):
+    machine_info, test_results = parse_files([example_file_path], fields=('flags', 'asset_id'))
+    with pytest.raises(ValueError, match='site_name'):
+        write_snapshot(str(tmp_path / 'session.sssnap'), machine_info, test_results)
+    assert not os.path.exists(tmp_path / 'session.sssnap')
@@ -0,0 +1,36 @@
+import os
+from datetime import date, datetime
+
+from parser import build_arg_parser
+from sss_reader import RecordFilter, parse_files
+
+example_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TestResults.sss')
+
+
+def count(record_filter):
+    machine_info, test_results = parse_files([example_file_path], record_filter=record_filter)
+    return len(test_results)
+
+
+def test_to_date_includes_the_whole_day():
+    args = build_arg_parser().parse_args(['validate', '--from', '2025-09-28', '--to', '2025-09-28', 'x.sss'])
+    assert args.start == date(2025, 9, 28) and args.end == date(2025, 9, 28)
+
+    whole_day = count(RecordFilter(end_time=args.end))
+    assert whole_day > 0
+    assert whole_day == count(RecordFilter(end_time=datetime(2025, 9, 28, 23, 59, 59)))
+    assert count(RecordFilter(start_time=args.start)) == count(RecordFilter(start_time=datetime(2025, 9, 28)))
+
+
+def test_to_time_is_kept():
+    args = build_arg_parser().parse_args(['validate', '--to', '2025-09-28T12:00', 'x.sss'])
+    assert args.end == datetime(2025, 9, 28, 12, 0)
+
+
+def test_matches_record_agrees_with_raw_header_filter():
+    machine_info, test_results = parse_files([example_file_path])
+    for kwargs in [dict(statuses=['FAIL']), dict(site_names=[test_results[0].site_name]),
+                   dict(location_names=[test_results[-1].location_name]), dict(end_time=date(2025, 9, 28)),
+                   dict(start_time=test_results[0].test_time, end_time=test_results[0].test_time)]:
+        decoded = [record for record in test_results if RecordFilter(**kwargs).matches_record(record)]
+        assert len(decoded) == count(RecordFilter(**kwargs))